@@ -1,29 +1,56 @@
-import subprocess
 import os
 import sys
 import time
 import shutil
-from datetime import datetime
-
-
-def remove_tester_log_dir():
-    try:
-        shutil.rmtree('tester_logs')
-        print("Successfully removed 'tester_logs' directory and all its contents.")
-    except FileNotFoundError:
-        print("'tester_logs' directory not found.")
-    except Exception as e:
-        print(f"Error while deleting 'tester_logs' directory: {e}")
+import hashlib
+import argparse
+import json
+import threading
+import report_parser
+import norminette_cache
+import log_writer
+import tester_executor
+from concurrent.futures import ThreadPoolExecutor
+
+# Each compile option is built in its own copy of the project, under this directory
+BUILD_DIR = '.tester_build'
+# Directories that belong to the tester, never part of the project sources
+TESTER_DIRS = {log_writer.LOG_ROOT, BUILD_DIR, '.git', norminette_cache.CACHE_DIR}
+COMPILE_OPTIONS = ["all", "debug", "asan", "tsan"]
+# Static libraries make built in a build directory, as paths relative to the
+# project: only these are build products, prebuilt ones are project sources
+MADE_ARCHIVES = os.path.join(BUILD_DIR, '.tester_archives')
+archives_lock = threading.Lock()
+# Every valgrind run gets a working directory under <build dir>/RUNS_DIR
+RUNS_DIR = '.tester_runs'
+# Extra valgrind arguments that write a parsable report, and the report's file name
+VALGRIND_REPORTS = {
+    "--leak-check=full": (["--xml=yes", "--xml-file=memcheck.xml"], "memcheck.xml"),
+    "--tool=memcheck": (["--log-file=valgrind.log"], "valgrind.log"),
+    "--tool=helgrind": (["--log-file=valgrind.log"], "valgrind.log"),
+    "--tool=drd": (["--log-file=valgrind.log"], "valgrind.log"),
+}
+# Options built with a sanitizer, also run without valgrind to get the sanitizer's report
+SANITIZER_OPTIONS = {"asan", "tsan"}
+# --profile runs these valgrind tools on the release build: callgrind for the
+# instruction counts and the call graph, cachegrind for the cache misses
+PROFILE_OPTION = "all"
+PROFILE_TOOLS = {
+    "callgrind": (["--tool=callgrind", "--callgrind-out-file=callgrind.out"], "callgrind.out"),
+    "cachegrind": (["--tool=cachegrind", "--cache-sim=yes", "--cachegrind-out-file=cachegrind.out"], "cachegrind.out"),
+}
 
 
 def run_norminette():
-    norminette_output, err, returncode, _, _ = run_command(["norminette"])
-    norminette_lines = norminette_output.decode('utf-8').split('\n')
-    
-    if all(line.endswith("OK!") for line in norminette_lines):
+    # Only the files that changed since the last run go through norminette, the rest comes from the cache
+    report = norminette_cache.check_norm()
+    norminette_output = "\n".join(line for _, _, lines in report for line in lines)
+    write_output_to_file(["norminette"], norminette_output.encode('utf-8'))
+
+    if all(ok for _, ok, _ in report):
         print(f"Norminette passed!")
     else:
-        print(f"Norminette failed: {norminette_output.decode('utf-8')}")
+        print(f"Norminette failed: {norminette_output}")
 
 def check_tool_exists(tool):
     _, err, returncode, _, _ = run_command(['which', tool])
@@ -32,51 +59,66 @@ def check_tool_exists(tool):
         sys.exit(1)
 
 def write_output_to_file(command, output):
-    """Writes the output of a command to a file."""
-    
-    # Create a tester_log directory if it doesn't exist
-    if not os.path.exists('tester_logs'):
-        os.makedirs('tester_logs')
-    
-    # Get the current datetime to include in the filename
-    current_datetime = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    
-    # Generate a filename based on the command, datetime and a timestamp
-    file_name = "_".join(command).replace('/', '_') + f"_{current_datetime}_{int(time.time())}.txt"
-    
-    # Update the path to save inside the tester_log directory
-    file_path = os.path.join('tester_logs', file_name)
-
-    with open(file_path, 'w') as f:
-        f.write(output.decode('utf-8'))
-    return file_path
-
-def run_command(command):
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    out, err = process.communicate()
-    output_filename = write_output_to_file(command, out)
-    if err:
-        error_filename = write_output_to_file(command + ["_error"], err)
-    else:
-        error_filename = None
-    return out, err, process.returncode, output_filename, error_filename
-
-
-
-def get_all_files_in_dir(path='.'):
-    """Get a list of all files in the given directory and its sub-directories."""
-    return [os.path.join(dp, f) for dp, dn, filenames in os.walk(path) for f in filenames]
-
-def rename_generated_files(initial_files, command, binary_name=None):
-    current_files = set(get_all_files_in_dir())
-    new_files = current_files - initial_files
-    for file in new_files:
-        if binary_name and file == binary_name or file.endswith(".o"):
+    """Writes the output of a command to a log file of the current run, returns its paths."""
+    writer = log_writer.LogWriter(log_writer.log_name(command), command)
+    writer.write(output)
+    writer.close()
+    return writer.paths
+
+def run_command(command, cwd=None):
+    """Runs a command, streaming its stdout and stderr to the run's logs as they are produced.
+
+    Returns (stdout tail, stderr tail, returncode, stdout log parts, stderr log parts).
+    Only the last log_writer.TAIL_SIZE bytes of each stream are kept in memory,
+    the full output is in the logs.
+    """
+    # Commands running in a build directory are tagged with it, the same command runs in every variant
+    log_name = command if cwd in (None, '.') else [os.path.basename(cwd)] + command
+    name = log_writer.log_name(log_name)
+    out_writer = log_writer.LogWriter(name, command, cwd, "stdout")
+    err_writer = log_writer.LogWriter(name + "__error", command, cwd, "stderr")
+    returncode = tester_executor.run(command, cwd=cwd, stdout=out_writer.write, stderr=err_writer.write).returncode
+    out_writer.close(returncode)
+    err_writer.close(returncode)
+    return out_writer.tail_bytes(), err_writer.tail_bytes(), returncode, out_writer.paths, err_writer.paths
+
+
+
+def snapshot_files(path='.'):
+    """Maps every regular file under path to its (inode, mtime, size).
+
+    Tester directories (logs, build copies, run directories, .git) are never
+    entered, and symlinks are skipped, so only files a step can create are listed.
+    """
+    snapshot = {}
+    directories = [path]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in TESTER_DIRS and entry.name != RUNS_DIR:
+                        directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    snapshot[entry.path] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+def created_files(initial_files, path='.'):
+    """Returns the files under path that are new since the initial_files snapshot (or were recreated)."""
+    return sorted(file for file, (inode, _, _) in snapshot_files(path).items()
+                  if file not in initial_files or initial_files[file][0] != inode)
+
+def rename_generated_files(initial_files, command, binary_name=None, path='.'):
+    """Moves the files created since initial_files into the run's log directory, returns their new paths."""
+    moved = []
+    for file in created_files(initial_files, path):
+        if binary_name and file == os.path.join(path, binary_name) or file.endswith((".o", ".a")):
             continue
         new_name = "_".join(command).replace('/', '_') + f"_{os.path.basename(file)}"
-        # Update the path to save inside the tester_log directory
-        new_path = os.path.join('tester_logs', new_name)
+        new_path = os.path.join(log_writer.current_run_dir(), new_name)
         os.rename(file, new_path)
+        moved.append(new_path)
+    return moved
 
 def summarize_file_types(path='.'):
     """Count and display the number of files of each type in the given directory."""
@@ -91,7 +133,7 @@ def summarize_file_types(path='.'):
     counts = {file_type: 0 for file_type in file_types}
     other_files = 0
     
-    all_files = get_all_files_in_dir(path)
+    all_files = snapshot_files(path)
     
     for file in all_files:
         file_ext = os.path.splitext(file)[1]
@@ -106,38 +148,261 @@ def summarize_file_types(path='.'):
     
     print(f"Other files: {other_files}")
 
-def compile_with_make(target, binary_name=None):
-    initial_files = set(get_all_files_in_dir())
-    out, err, returncode, _, _ = run_command(["make", target])
+def compile_with_make(target, binary_name=None, cwd='.', log=print):
+    """Runs make target in cwd, returns False if it failed."""
+    initial_files = snapshot_files(cwd)
+    out, err, returncode, _, _ = run_command(["make", target], cwd=cwd)
     if returncode != 0:
-        print(f"Failed to compile using 'make {target}': {err.decode('utf-8')}")
-        sys.exit(1)
-    rename_generated_files(initial_files, ["make", target], binary_name)
-    print(out.decode('utf-8'))
-
-def test_with_valgrind(option, binary, params):
-    tools = ["memcheck", "helgrind", "drd", "cachegrind"]
-
-    initial_files = set(get_all_files_in_dir())
-    print(f"\nTesting option {option} and with valgrind --leak-check=full")
-    out, err, returncode, _, _ = run_command(["valgrind", f"--leak-check=full", binary] + params)
+        log(f"Failed to compile using 'make {target}': {err.decode('utf-8', errors='replace')}")
+        return False
+    generated = rename_generated_files(initial_files, ["make", target] if cwd == '.' else [os.path.basename(cwd), "make", target], binary_name, cwd)
+    log(out.decode('utf-8', errors='replace'))
+    if generated:
+        log(f"Generated files: {', '.join(generated)}")
+    return True
+
+def make_run_dir(build_dir, name):
+    """Creates an empty working directory for one valgrind run, with the build's files symlinked in.
+
+    The links keep relative paths used by the binary (maps, textures...) working,
+    while the files valgrind generates land in a directory no other run writes to.
+    """
+    run_dir = os.path.join(build_dir, RUNS_DIR, name)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    for entry in os.listdir(build_dir):
+        if entry != RUNS_DIR:
+            os.symlink(os.path.abspath(os.path.join(build_dir, entry)), os.path.join(run_dir, entry))
+    return run_dir
+
+def write_report(option, label, summary):
+    """Saves a parsed report as JSON in the reports directory of the run's logs."""
+    report_dir = os.path.join(log_writer.current_run_dir(), 'reports')
+    os.makedirs(report_dir, exist_ok=True)
+    with open(os.path.join(report_dir, f"{option}_{label}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+def run_valgrind(option, flag, binary, params, build_dir):
+    """Runs valgrind with one flag in its own run directory.
+
+    Returns (lines to report, returncode, seconds, parsed report or None).
+    """
+    lines = []
+    label = flag.lstrip('-').replace('=', '_')
+    run_dir = make_run_dir(build_dir, f"{option}_{label}")
+    report_args, report_file = VALGRIND_REPORTS.get(flag, ([], None))
+    initial_files = snapshot_files(run_dir)
+    start = time.time()
+    out, err, returncode, _, _ = run_command(["valgrind", flag] + report_args + [binary] + params, cwd=run_dir)
+    elapsed = time.time() - start
     if returncode != 0:
-        print(f"Valgrind testing option {option} and leaks failed: {err.decode('utf-8')}")
-    rename_generated_files(initial_files, [option, "valgrind", f"--leak-check=full", binary])
-    print(out.decode('utf-8'))
-
-    for tool in tools:
-        initial_files = set(get_all_files_in_dir())
-        print(f"\nTesting with option {option} and valgrind --tool={tool}")
-        # Append params when calling the binary
-        out, err, returncode, _, _ = run_command(["valgrind", f"--tool={tool}", binary] + params)
-        if returncode != 0:
-            print(f"Valgrind testing with option {option} and tool {tool} failed: {err.decode('utf-8')}")
-        rename_generated_files(initial_files, [option, "valgrind", f"--tool={tool}", binary])
-        print(out.decode('utf-8'))
-
-def add_lines_to_makefile():
-    with open("Makefile", "r+") as file:
+        lines.append(f"Valgrind testing with option {option} and {flag} failed: {err.decode('utf-8', errors='replace')}")
+    summary = None
+    report_path = os.path.join(run_dir, report_file) if report_file else None
+    if report_path and os.path.isfile(report_path):
+        if report_file.endswith(".xml"):
+            summary = report_parser.parse_memcheck_xml(report_path)
+        else:
+            summary = report_parser.parse_valgrind_log(report_path, flag.split('=')[-1])
+        write_report(option, label, summary)
+    generated = rename_generated_files(initial_files, [option, "valgrind", flag, binary], path=run_dir)
+    lines.append(out.decode('utf-8', errors='replace'))
+    if generated:
+        lines.append(f"Generated files: {', '.join(generated)}")
+    return lines, returncode, elapsed, summary
+
+def run_native(option, binary, params, build_dir):
+    """Runs a sanitizer build without valgrind, returns (lines to report, returncode, seconds, parsed report)."""
+    run_dir = make_run_dir(build_dir, f"{option}_native")
+    initial_files = snapshot_files(run_dir)
+    start = time.time()
+    out, err, returncode, _, error_files = run_command([binary] + params, cwd=run_dir)
+    elapsed = time.time() - start
+    lines = [out.decode('utf-8', errors='replace')]
+    if returncode != 0:
+        lines.insert(0, f"Native run with option {option} failed: {err.decode('utf-8', errors='replace')}")
+    # The sanitizers report on stderr, parse the whole log it was streamed to, not just the tail
+    summary = report_parser.parse_sanitizer_log(log_writer.read_lines(error_files)) if error_files else \
+        {"tool": "sanitizer", "error_count": 0, "errors": [], "leaks": {}}
+    write_report(option, "native", summary)
+    generated = rename_generated_files(initial_files, [option, binary], path=run_dir)
+    if generated:
+        lines.append(f"Generated files: {', '.join(generated)}")
+    return lines, returncode, elapsed, summary
+
+def test_with_valgrind(option, binary, params, cwd='.', log=print, executor=None):
+    """Runs every valgrind tool (and a native run for sanitizer builds), returns (label, report) rows."""
+    flags = ["--leak-check=full", "--tool=memcheck", "--tool=helgrind", "--tool=drd", "--tool=cachegrind"]
+    # valgrind runs inside a run directory linked to cwd, so the binary is referenced from there
+    binary = os.path.join('.', binary)
+
+    jobs = [(flag, run_valgrind, (option, flag, binary, params, cwd)) for flag in flags]
+    if option in SANITIZER_OPTIONS:
+        jobs.append(("native", run_native, (option, binary, params, cwd)))
+    if executor is None:
+        results = [function(*job_args) for _, function, job_args in jobs]
+    else:
+        futures = [executor.submit(function, *job_args) for _, function, job_args in jobs]
+        results = [future.result() for future in futures]
+
+    for (flag, _, _), (lines, _, _, _) in zip(jobs, results):
+        log(f"\nTesting with option {option} and valgrind {flag}" if flag != "native"
+            else f"\nTesting with option {option} without valgrind")
+        for line in lines:
+            log(line)
+
+    log(f"\nValgrind summary for option {option}:")
+    rows = []
+    for (flag, _, _), (_, returncode, elapsed, summary) in zip(jobs, results):
+        status = tester_executor.classify(returncode)
+        errors = f"{summary['error_count']} errors" if summary else ""
+        log(f"  {flag:<20} {status:<10} {elapsed:>6.1f}s  {errors}")
+        if summary:
+            rows.append((f"{option} {flag.lstrip('-')}", summary))
+    return rows
+
+def made_archives():
+    """Returns the .a files (relative to the project) an earlier build made, empty before the first build."""
+    try:
+        with open(MADE_ARCHIVES) as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return set()
+
+def record_made_archives(initial_files, build_dir):
+    """Adds the .a files make created in build_dir since the initial_files snapshot to MADE_ARCHIVES."""
+    made = {os.path.relpath(file, build_dir) for file in created_files(initial_files, build_dir) if file.endswith(".a")}
+    # The options build in parallel, each adds its archives to the others'
+    with archives_lock:
+        made |= made_archives()
+        with open(MADE_ARCHIVES, 'w') as f:
+            json.dump(sorted(made), f)
+
+def source_fingerprint(binary_name, path='.'):
+    """Hashes every project file (paths and contents), skipping tester directories and build products."""
+    made = made_archives()
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if d not in TESTER_DIRS)
+        for filename in sorted(filenames):
+            file = os.path.join(dirpath, filename)
+            if filename.endswith(".o") or os.path.relpath(file, path) in made | {binary_name}:
+                continue
+            digest.update(os.path.relpath(file, path).encode())
+            with open(file, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def prepare_build_dir(option, binary_name, fingerprint):
+    """Copies the project into the option's build directory, returns (path, True if it is already up to date)."""
+    build_dir = os.path.join(BUILD_DIR, option)
+    stamp_path = os.path.join(build_dir, '.tester_stamp')
+    if os.path.isfile(stamp_path) and os.access(os.path.join(build_dir, binary_name), os.X_OK):
+        with open(stamp_path) as f:
+            if f.read() == fingerprint:
+                return build_dir, True
+    shutil.rmtree(build_dir, ignore_errors=True)
+    made = made_archives()
+
+    def ignore(directory, names):
+        # Build products left in the project are not copied, fclean would not always remove them
+        return [name for name in names if name in TESTER_DIRS or name.endswith(".o")
+                or os.path.relpath(os.path.join(directory, name)) in made]
+
+    shutil.copytree('.', build_dir, ignore=ignore)
+    add_lines_to_makefile(os.path.join(build_dir, "Makefile"))
+    return build_dir, False
+
+def build_variant(option, binary_name, fingerprint, log=print):
+    """Builds one compile option in its own directory, returns the directory or None if the build failed."""
+    build_dir, up_to_date = prepare_build_dir(option, binary_name, fingerprint)
+    if up_to_date:
+        log(f"\nSources unchanged, reusing the '{option}' build in {build_dir}\n")
+    else:
+        log(f"\nCompiling with option: {option}\n")
+        initial_files = snapshot_files(build_dir)
+        if not compile_with_make("fclean", binary_name, build_dir, log) \
+                or not compile_with_make(option, binary_name, build_dir, log):
+            return None
+        record_made_archives(initial_files, build_dir)
+        # Only stamp a successful build, a failed one has to be rebuilt next time
+        with open(os.path.join(build_dir, '.tester_stamp'), 'w') as f:
+            f.write(fingerprint)
+    if not os.access(os.path.join(build_dir, binary_name), os.X_OK):
+        log(f"Error: Binary '{binary_name}' not found or not executable.")
+        return None
+    return build_dir
+
+def build_and_test_variant(option, binary_name, params, fingerprint, valgrind_executor=None):
+    """Builds one compile option in its own directory and tests it.
+
+    Returns (lines to report, (label, parsed report) rows).
+    """
+    lines = []
+    build_dir = build_variant(option, binary_name, fingerprint, lines.append)
+    if build_dir is None:
+        return lines, []
+    return lines, test_with_valgrind(option, binary_name, params, build_dir, lines.append, valgrind_executor)
+
+def profile_binary(binary_name, params, build_dir, jobs=1):
+    """Runs callgrind and cachegrind on a build, returns their merged profile or None if both failed."""
+    binary = os.path.join('.', binary_name)
+
+    def run_tool(tool):
+        tool_args, out_file = PROFILE_TOOLS[tool]
+        run_dir = make_run_dir(build_dir, f"profile_{tool}")
+        _, err, returncode, _, _ = run_command(["valgrind"] + tool_args + [binary] + params, cwd=run_dir)
+        out_path = os.path.join(run_dir, out_file)
+        if not os.path.isfile(out_path):
+            print(f"{tool} produced no profile (exit {returncode}): {err.decode('utf-8', errors='replace')}")
+            return None
+        # Kept with the run's logs, callgrind_annotate and kcachegrind can open it later
+        saved = os.path.join(log_writer.current_run_dir(), out_file)
+        shutil.move(out_path, saved)
+        return report_parser.parse_profile(saved, tool)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        profiles = [profile for profile in executor.map(run_tool, PROFILE_TOOLS) if profile is not None]
+    return report_parser.merge_profiles(profiles) if profiles else None
+
+def run_profile(binary_name, params, fingerprint, top, baseline_path, threshold, update_baseline, jobs=1):
+    """Profiles the release build and compares it with the baseline, returns the number of regressions."""
+    build_dir = build_variant(PROFILE_OPTION, binary_name, fingerprint)
+    if build_dir is None:
+        return 1
+    profile = profile_binary(binary_name, params, build_dir, jobs)
+    if profile is None:
+        return 1
+    profile.update(binary=binary_name, params=params)
+    write_report(PROFILE_OPTION, "profile", profile)
+    print(f"\nHot functions of '{binary_name} {' '.join(params)}' (build '{PROFILE_OPTION}'):")
+    print(report_parser.format_profile(profile, top))
+
+    regressions = 0
+    baseline = None
+    if os.path.isfile(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    if baseline is not None:
+        if baseline.get("params") != params:
+            print(f"\nWarning: the baseline was recorded with other arguments: {' '.join(baseline.get('params', []))}")
+        rows = report_parser.diff_profiles(profile, baseline, top, threshold)
+        regressions = sum(row["regression"] for row in rows)
+        print(f"\nCompared with the baseline {baseline_path} (regression threshold {threshold}%):")
+        print(report_parser.format_profile_diff(rows))
+        if regressions:
+            print(f"\n{regressions} performance regression(s) above {threshold}%")
+        else:
+            print("\nNo performance regression")
+    if baseline is None or update_baseline:
+        os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(profile, f, indent=2)
+        print(f"\nSaved this profile as the baseline: {baseline_path}")
+    return regressions
+
+def add_lines_to_makefile(makefile="Makefile"):
+    with open(makefile, "r+") as file:
         content = file.read()
 
         debug_string = "debug: FLAGS += -O0 -g\ndebug: all\n"
@@ -158,56 +423,82 @@ def add_lines_to_makefile():
         file.truncate()
 
 
-def remove_lines_from_makefile():
-    with open("Makefile", "r+") as file:
-        content = file.read()
-
-        debug_string = "debug: FLAGS += -O0 -g\ndebug: all\n"
-        asan_string = "asan: FLAGS += -fsanitize=address\nasan: all\n"
-        tsan_string = "tsan: FLAGS += -fsanitize=thread\ntsan: all\n"
-
-        # Remove the specified strings if they exist
-        content = content.replace(debug_string, "")
-        content = content.replace(asan_string, "")
-        content = content.replace(tsan_string, "")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Builds a project with several compile options and tests the binary.")
+    parser.add_argument("-j", "--jobs", type=int, default=len(COMPILE_OPTIONS),
+                        help=f"number of compile options built and tested at the same time (default: {len(COMPILE_OPTIONS)})")
+    parser.add_argument("--valgrind-jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of valgrind runs allowed at the same time, across all options (default: CPU count)")
+    parser.add_argument("--log-compression", choices=["none", "gzip", "zstd"], default="none",
+                        help="compress the logs as they are written (zstd needs the 'zstandard' package)")
+    parser.add_argument("--log-max-size", type=int, default=64, metavar="MB",
+                        help="size of a log file before it is rotated into a new part (default: 64)")
+    parser.add_argument("--log-budget", type=int, default=1024, metavar="MB",
+                        help="disk space the logs of all runs may use, the oldest runs are deleted first (default: 1024)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"only build the '{PROFILE_OPTION}' option and profile it with callgrind and cachegrind")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="number of hot functions reported and compared (default: 10)")
+    parser.add_argument("--profile-baseline", metavar="PATH",
+                        help=f"profile to compare with, saved by the first --profile run "
+                             f"(default: {norminette_cache.CACHE_DIR}/profile_<binary>.json)")
+    parser.add_argument("--profile-threshold", type=float, default=5.0, metavar="PERCENT",
+                        help="growth of instructions or cache misses reported as a regression (default: 5)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="save this run's profile as the new baseline after comparing")
+    parser.add_argument("binary", help="name of the binary the Makefile builds")
+    parser.add_argument("params", nargs=argparse.REMAINDER, help="arguments passed to the binary")
+    return parser.parse_args()
 
-        # Write back the updated content to the Makefile
-        file.seek(0)
-        file.write(content)
-        file.truncate()
 def main():
-
-    if len(sys.argv) < 2:
-        print("Please provide the binary name as the first argument.")
+    args = parse_args()
+    binary_name = args.binary
+    params = args.params
+    try:
+        log_writer.configure(None if args.log_compression == "none" else args.log_compression,
+                             args.log_max_size * 1024 * 1024, args.log_budget * 1024 * 1024)
+    except ValueError as e:
+        print(f"Error: {e}")
         sys.exit(1)
-
-    binary_name = sys.argv[1]
-    params = sys.argv[2:]
+    # Every run keeps its logs in a new directory, older runs are only deleted past the disk budget
+    run_dir = log_writer.start_run(sys.argv)
+    # Builds and valgrind runs all go through the shared engine, Ctrl-C kills them all
+    tester_executor.configure(args.jobs + args.valgrind_jobs)
+    print(f"Logs of this run: {run_dir}")
     # Ensure necessary tools are installed
     check_tool_exists('valgrind')
+    if args.profile:
+        # Profiling mode: no norminette and no test matrix, exits with 1 on a regression
+        baseline_path = args.profile_baseline or os.path.join(norminette_cache.CACHE_DIR, f"profile_{binary_name}.json")
+        check_tool_exists('make')
+        regressions = run_profile(binary_name, params, source_fingerprint(binary_name), args.profile_top,
+                                  baseline_path, args.profile_threshold, args.update_baseline, args.valgrind_jobs)
+        sys.exit(1 if regressions else 0)
     check_tool_exists('norminette')
     check_tool_exists('make')
-    remove_tester_log_dir()
-    add_lines_to_makefile()
     # Cleanup before starting
-    compile_with_make("fclean", binary_name)
+    if not compile_with_make("fclean", binary_name):
+        sys.exit(1)
 
     summarize_file_types()
     run_norminette()
 
-    compile_options = ["all", "debug", "asan", "tsan"]
-
-    for option in compile_options:
-        compile_with_make("fclean", binary_name)
-        print(f"\nCompiling with option: {option}\n")
-        compile_with_make(option, binary_name)
-        # Check if binary exists and then test with valgrind
-        if os.access(binary_name, os.X_OK):
-            test_with_valgrind(option, binary_name, params)
-        else:
-            print(f"Error: Binary '{binary_name}' not found or not executable.")
-    remove_lines_from_makefile()
+    fingerprint = source_fingerprint(binary_name)
+    # The valgrind runs of every option share one pool, so the limit holds for the whole run
+    with ThreadPoolExecutor(max_workers=max(1, args.valgrind_jobs)) as valgrind_executor, \
+            ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = [executor.submit(build_and_test_variant, option, binary_name, params, fingerprint,
+                                   valgrind_executor)
+                   for option in COMPILE_OPTIONS]
+        # Reports are printed in option order, whatever order the variants finish in
+        rows = []
+        for future in futures:
+            lines, variant_rows = future.result()
+            for line in lines:
+                print(line)
+            rows += variant_rows
+    if rows:
+        print(f"\nReport summary (JSON reports in {os.path.join(run_dir, 'reports')}):")
+        print(report_parser.format_table(rows))
 if __name__ == "__main__":
     main()
-
-    
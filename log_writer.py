@@ -0,0 +1,209 @@
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Streaming command logs for the testers. Every tester invocation gets its own
+# tester_logs/run_NNNN directory with a manifest.json listing the logs it wrote.
+# Output is written to disk as it is produced, optionally gzip/zstd compressed,
+# and rotated into numbered parts once a part reaches the size limit. Old runs
+# are deleted, oldest first, once all runs together exceed the disk budget.
+
+LOG_ROOT = 'tester_logs'
+# Bytes of each stream kept in memory, for the testers to print
+TAIL_SIZE = 64 * 1024
+# File names longer than this are cut, commands can carry hundreds of arguments
+MAX_NAME_LENGTH = 150
+
+settings = {
+    "compression": None,                # None, "gzip" or "zstd"
+    "max_bytes": 64 * 1024 * 1024,      # size of one part before rotating
+    "budget": 1024 * 1024 * 1024,       # disk space all runs may use together
+}
+run_dir = None
+manifest = {}
+manifest_lock = threading.Lock()
+
+
+def configure(compression=None, max_bytes=None, budget=None):
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the 'zstandard' package (pip install zstandard)")
+    settings["compression"] = compression
+    if max_bytes:
+        settings["max_bytes"] = max_bytes
+    if budget:
+        settings["budget"] = budget
+
+
+def run_number(name):
+    match = re.fullmatch(r'run_(\d+)', name)
+    return int(match.group(1)) if match else None
+
+
+def directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames
+                     if not os.path.islink(os.path.join(dirpath, f)))
+    return total
+
+
+def prune_runs(keep=None):
+    """Deletes the oldest runs until all runs fit in the disk budget, never the run in keep."""
+    if not os.path.isdir(LOG_ROOT):
+        return []
+    runs = sorted((run_number(name), os.path.join(LOG_ROOT, name)) for name in os.listdir(LOG_ROOT)
+                  if run_number(name) is not None)
+    sizes = {path: directory_size(path) for _, path in runs}
+    total = sum(sizes.values())
+    removed = []
+    for _, path in runs:
+        if total <= settings["budget"]:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= sizes[path]
+        removed.append(path)
+    return removed
+
+
+def start_run(command=None):
+    """Creates the next run directory and makes it the target of every log, returns its path."""
+    global run_dir, manifest
+    os.makedirs(LOG_ROOT, exist_ok=True)
+    numbers = [run_number(name) for name in os.listdir(LOG_ROOT)]
+    number = max([n for n in numbers if n is not None], default=0) + 1
+    run_dir = os.path.join(LOG_ROOT, f"run_{number:04d}")
+    os.makedirs(run_dir)
+    manifest = {"run": number, "started": datetime.now().isoformat(timespec='seconds'),
+                "command": command or [], "compression": settings["compression"], "logs": []}
+    write_manifest()
+    prune_runs(keep=run_dir)
+    return run_dir
+
+
+def current_run_dir():
+    return run_dir if run_dir is not None else start_run()
+
+
+def write_manifest():
+    with manifest_lock:
+        with open(os.path.join(run_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+
+def log_name(command):
+    """Builds a log file name from a command, the date and a timestamp."""
+    current_datetime = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    name = "_".join(command).replace('/', '_')[:MAX_NAME_LENGTH]
+    return f"{name}_{current_datetime}_{int(time.time())}"
+
+
+class LogWriter:
+    """File-like sink that streams bytes into rotated, optionally compressed log parts.
+
+    Nothing is created until the first write, so an empty stream leaves no file.
+    The last TAIL_SIZE bytes are kept in memory in tail.
+    """
+
+    def __init__(self, name, command=None, cwd=None, stream="stdout"):
+        self.base = os.path.join(current_run_dir(), name)
+        self.command = command or []
+        self.cwd = cwd
+        self.stream = stream
+        self.paths = []
+        self.file = None
+        self.part_bytes = 0
+        self.total_bytes = 0
+        self.tail = bytearray()
+
+    def part_path(self):
+        suffix = "" if not self.paths else f".{len(self.paths)}"
+        extension = {None: "", "gzip": ".gz", "zstd": ".zst"}[settings["compression"]]
+        return f"{self.base}{suffix}.txt{extension}"
+
+    def open_part(self):
+        path = self.part_path()
+        if settings["compression"] == "gzip":
+            self.file = gzip.open(path, 'wb', compresslevel=6)
+        elif settings["compression"] == "zstd":
+            self.file = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+        else:
+            self.file = open(path, 'wb')
+        self.paths.append(path)
+        self.part_bytes = 0
+
+    def write(self, data):
+        if not data:
+            return
+        if self.file is None or self.part_bytes >= settings["max_bytes"]:
+            if self.file is not None:
+                self.file.close()
+            self.open_part()
+        self.file.write(data)
+        self.part_bytes += len(data)
+        self.total_bytes += len(data)
+        self.tail += data
+        if len(self.tail) > TAIL_SIZE:
+            del self.tail[:len(self.tail) - TAIL_SIZE]
+
+    def close(self, returncode=None):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        with manifest_lock:
+            manifest["logs"].append({"command": self.command, "cwd": self.cwd, "stream": self.stream,
+                                     "files": [os.path.basename(path) for path in self.paths],
+                                     "bytes": self.total_bytes, "returncode": returncode})
+        write_manifest()
+
+    def tail_bytes(self):
+        """The kept tail, with a note when earlier output only went to disk."""
+        if self.total_bytes <= len(self.tail):
+            return bytes(self.tail)
+        # The tail was cut at any byte, start it at the next UTF-8 character (continuation bytes are 10xxxxxx)
+        start = 0
+        while start < min(3, len(self.tail)) and self.tail[start] & 0xC0 == 0x80:
+            start += 1
+        note = f"[... {self.total_bytes - len(self.tail) + start} bytes only in {self.paths[0]} ...]\n"
+        return note.encode() + bytes(self.tail[start:])
+
+
+def open_part(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', errors='replace')
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError(f"reading {path} needs the 'zstandard' package")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True),
+                                errors='replace')
+    return open(path, errors='replace')
+
+
+def read_lines(paths):
+    """Yields the text lines of a rotated, possibly compressed log, part after part."""
+    carry = ""
+    for path in paths:
+        with open_part(path) as f:
+            for line in f:
+                if carry:
+                    line, carry = carry + line, ""
+                if not line.endswith("\n"):
+                    # Rotation can cut a line in two, glue it back to the start of the next part
+                    carry = line
+                    continue
+                yield line
+    if carry:
+        yield carry
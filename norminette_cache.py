@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import tester_executor
+
+# Runs norminette only on the files that changed since the last run. Verdicts are
+# cached per file in .tester_cache/norminette.json, keyed by the file's name and
+# the SHA-256 of its content (norminette checks the 42 header and include guards
+# against the file name), and thrown away when the norminette version changes.
+
+CACHE_DIR = '.tester_cache'
+CACHE_FILE = os.path.join(CACHE_DIR, 'norminette.json')
+# Directories that never hold project sources
+SKIPPED_DIRS = {'.git', CACHE_DIR, 'tester_logs', '.tester_build'}
+# Number of files handed to a single norminette process
+BATCH_SIZE = 20
+
+
+def norminette_version():
+    try:
+        result = tester_executor.run(["norminette", "-v"])
+    except OSError:
+        return "unknown"
+    return result.stdout.decode(errors='replace').strip() if result.returncode == 0 else "unknown"
+
+
+def find_sources(path='.'):
+    """Returns every .c and .h file under path, sorted."""
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames if d not in SKIPPED_DIRS]
+        sources += [os.path.join(dirpath, f) for f in filenames if f.endswith(('.c', '.h'))]
+    return sorted(sources)
+
+
+def file_key(path):
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return f"{os.path.basename(path)}:{digest}"
+
+
+def load_cache(version):
+    try:
+        with open(CACHE_FILE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache["files"] if cache.get("version") == version else {}
+
+
+def save_cache(version, files):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(CACHE_FILE, 'w') as f:
+        json.dump({"version": version, "files": files}, f)
+
+
+def parse_output(output):
+    """Splits norminette output into {path: (ok, lines)}."""
+    results = {}
+    current = None
+    for line in output.split('\n'):
+        if line.endswith(": OK!") or line.endswith(": Error!"):
+            current = line.rsplit(": ", 1)[0]
+            results[current] = (line.endswith("OK!"), [line])
+        elif current is not None and line.strip():
+            results[current][1].append(line)
+    return results
+
+
+def run_batch(files):
+    output = tester_executor.run(["norminette"] + files, stderr=tester_executor.STDOUT).stdout.decode(errors='replace')
+    results = parse_output(output)
+    # A file norminette said nothing about (it crashed on it...) is not normed
+    for file in files:
+        results.setdefault(file, (False, [f"{file}: Error!", output.strip()]))
+    return results
+
+
+def check_norm(path='.', jobs=None):
+    """Returns [(file, ok, output lines)] for every source file, running norminette only on changed ones."""
+    version = norminette_version()
+    cached = load_cache(version)
+    sources = find_sources(path)
+    keys = {source: file_key(source) for source in sources}
+
+    changed = [source for source in sources if keys[source] not in cached]
+    batches = [changed[i:i + BATCH_SIZE] for i in range(0, len(changed), BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        for results in executor.map(run_batch, batches):
+            for source, (ok, lines) in results.items():
+                if source in keys:
+                    cached[keys[source]] = {"ok": ok, "lines": lines}
+
+    # Only keep the entries of files that still exist, the cache would otherwise grow forever
+    save_cache(version, {keys[source]: cached[keys[source]] for source in sources if keys[source] in cached})
+    report = []
+    for source in sources:
+        entry = cached.get(keys[source], {"ok": False, "lines": [f"{source}: Error!"]})
+        # Cached lines may name the file by another path, the key only depends on its name and content
+        lines = [f"{source}: {'OK!' if entry['ok'] else 'Error!'}"] + entry["lines"][1:]
+        report.append((source, entry["ok"], lines))
+    return report
@@ -0,0 +1,135 @@
+from collections import deque
+import re
+
+# In-process replacement for the ./checker binary: parses the arguments the
+# same way, applies the instructions push_swap emits and reports OK/KO/Error.
+
+min_int = -2147483648
+max_int = 2147483647
+number_pattern = re.compile(r'[+-]?[0-9]+')
+
+
+def parse_numbers(argv):
+    """Parses checker arguments, returns the list of ints or None if checker would print Error."""
+    numbers = []
+    for arg in argv:
+        # An argument may hold several numbers ("3 2 1"), but never zero
+        tokens = arg.split()
+        if not tokens:
+            return None
+        for token in tokens:
+            if not number_pattern.fullmatch(token):
+                return None
+            number = int(token)
+            if number < min_int or number > max_int:
+                return None
+            numbers.append(number)
+    if len(set(numbers)) != len(numbers):
+        return None
+    return numbers
+
+
+def swap(stack):
+    if len(stack) > 1:
+        stack[0], stack[1] = stack[1], stack[0]
+
+
+def push(src, dst):
+    if src:
+        dst.appendleft(src.popleft())
+
+
+def rotate(stack):
+    stack.rotate(-1)
+
+
+def reverse_rotate(stack):
+    stack.rotate(1)
+
+
+operations = {
+    b"sa": lambda a, b: swap(a),
+    b"sb": lambda a, b: swap(b),
+    b"ss": lambda a, b: (swap(a), swap(b)),
+    b"pa": lambda a, b: push(b, a),
+    b"pb": lambda a, b: push(a, b),
+    b"ra": lambda a, b: rotate(a),
+    b"rb": lambda a, b: rotate(b),
+    b"rr": lambda a, b: (rotate(a), rotate(b)),
+    b"rra": lambda a, b: reverse_rotate(a),
+    b"rrb": lambda a, b: reverse_rotate(b),
+    b"rrr": lambda a, b: (reverse_rotate(a), reverse_rotate(b)),
+}
+
+
+class StreamChecker:
+    """check() fed with chunks of output as they arrive, e.g. from tester_executor.
+
+    write() takes raw bytes, cut anywhere; result() returns (output, op_count)
+    once the stream ended. Input after the first invalid line is ignored.
+    """
+
+    def __init__(self, argv):
+        self.op_count = 0
+        self.pending = b""
+        # Known before reading any instruction when argv alone decides it
+        self.output = None
+        if not argv:
+            self.output = ""
+            return
+        numbers = parse_numbers(argv)
+        if numbers is None:
+            self.output = "Error"
+            return
+        self.a = deque(numbers)
+        self.b = deque()
+
+    def apply(self, line):
+        """Applies one instruction (without its newline), returns False once the verdict is Error."""
+        if self.output is not None:
+            return False
+        operation = operations.get(line)
+        if operation is None:
+            self.output = "Error"
+            return False
+        operation(self.a, self.b)
+        self.op_count += 1
+        return True
+
+    def write(self, chunk):
+        lines = (self.pending + chunk).split(b"\n")
+        self.pending = lines.pop()
+        for line in lines:
+            if not self.apply(line):
+                self.pending = b""
+                return
+
+    def result(self):
+        if self.pending:
+            # The last instruction had no newline
+            self.apply(self.pending)
+            self.pending = b""
+        if self.output is not None:
+            return self.output, self.op_count
+        result = list(self.a)
+        if self.b or any(result[i] > result[i + 1] for i in range(len(result) - 1)):
+            return "KO", self.op_count
+        return "OK", self.op_count
+
+
+def check(argv, instructions):
+    """Runs the instructions (an iterable of lines, e.g. a binary pipe) on argv.
+
+    Returns (output, op_count) where output is what ./checker prints:
+    "OK", "KO", "Error", or "" when no arguments were given.
+    """
+    checker = StreamChecker(argv)
+    # Lines are applied one at a time, so the full output is never held in memory
+    for line in instructions:
+        if isinstance(line, str):
+            line = line.encode()
+        if line.endswith(b"\n"):
+            line = line[:-1]
+        if not checker.apply(line):
+            break
+    return checker.result()
@@ -0,0 +1,186 @@
+import argparse
+import bisect
+from collections import Counter, deque
+import push_swap_checker
+
+# Reference move counts for push_swap outputs.
+#
+# Small inputs (up to MAX_EXACT numbers) are solved exactly: every push_swap
+# operation has an inverse (sa/sb/ss are their own, pa/pb, ra/rra, rb/rrb,
+# rr/rrr), so one breadth-first search from the sorted state gives the optimal
+# move count of every state of n numbers. A state is encoded as the ranks of
+# stack a, a separator and the ranks of stack b, in one bytes object, and the
+# table of each n is built once and kept in memory: 40320 states for n = 7
+# (7! orders times the 8 places to cut them between a and b), built in under a
+# second, n = 8 is nine times more.
+#
+# Bigger inputs get a lower bound: with LCIS the longest increasing subsequence
+# of stack a read as a circle, (size of a - LCIS) + size of b can only drop by
+# one per operation. Rotations do not change the circle, sa/ss change the
+# order of one pair, so LCIS by at most one, pb removes one element from a and
+# adds one to b, pa the other way round. It is 0 once sorted, so an input of n
+# numbers needs at least n - LCIS moves, and at least one when it is not sorted.
+
+MAX_EXACT = 7
+SEPARATOR = b'\xff'
+
+
+def swap(stack):
+    return stack[1:2] + stack[:1] + stack[2:]
+
+
+def rotate(stack):
+    return stack[1:] + stack[:1]
+
+
+def reverse_rotate(stack):
+    return stack[-1:] + stack[:-1]
+
+
+# name: function of (a, b) returning the new (a, b), the top of a stack is its first byte
+operations = {
+    "sa": lambda a, b: (swap(a), b),
+    "sb": lambda a, b: (a, swap(b)),
+    "ss": lambda a, b: (swap(a), swap(b)),
+    "pa": lambda a, b: (b[:1] + a, b[1:]) if b else (a, b),
+    "pb": lambda a, b: (a[1:], a[:1] + b) if a else (a, b),
+    "ra": lambda a, b: (rotate(a), b),
+    "rb": lambda a, b: (a, rotate(b)),
+    "rr": lambda a, b: (rotate(a), rotate(b)),
+    "rra": lambda a, b: (reverse_rotate(a), b),
+    "rrb": lambda a, b: (a, reverse_rotate(b)),
+    "rrr": lambda a, b: (reverse_rotate(a), reverse_rotate(b)),
+}
+
+tables = {}
+
+
+def encode(a, b=b''):
+    return bytes(a) + SEPARATOR + bytes(b)
+
+
+def neighbours(state):
+    """Yields (operation, next state) for every operation that changes state."""
+    a, _, b = state.partition(SEPARATOR)
+    for name, operation in operations.items():
+        next_a, next_b = operation(a, b)
+        if next_a != a or next_b != b:
+            yield name, next_a + SEPARATOR + next_b
+
+
+def distance_table(n):
+    """Optimal move count to sort every state of n numbers, {encoded state: moves}, built once per n."""
+    if n not in tables:
+        goal = encode(range(n))
+        table = {goal: 0}
+        queue = deque([goal])
+        while queue:
+            state = queue.popleft()
+            moves = table[state] + 1
+            for _, following in neighbours(state):
+                if following not in table:
+                    table[following] = moves
+                    queue.append(following)
+        tables[n] = table
+    return tables[n]
+
+
+def ranks(numbers):
+    """Replaces distinct numbers by their rank, 0 for the smallest."""
+    order = {number: rank for rank, number in enumerate(sorted(numbers))}
+    return [order[number] for number in numbers]
+
+
+def solve(numbers):
+    """Returns one optimal list of operations sorting numbers (at most MAX_EXACT of them)."""
+    table = distance_table(len(numbers))
+    state = encode(ranks(numbers))
+    solution = []
+    while table[state]:
+        # A neighbour one move closer always exists, the table was built from the goal
+        name, state = next((name, following) for name, following in neighbours(state)
+                           if table[following] == table[state] - 1)
+        solution.append(name)
+    return solution
+
+
+def optimal_moves(numbers):
+    return distance_table(len(numbers))[encode(ranks(numbers))]
+
+
+def longest_increasing(sequence):
+    tails = []
+    for value in sequence:
+        index = bisect.bisect_left(tails, value)
+        tails[index:index + 1] = [value]
+    return len(tails)
+
+
+def circular_lis(sequence):
+    """Longest increasing subsequence of sequence read as a circle, from any starting point."""
+    return max((longest_increasing(sequence[start:] + sequence[:start]) for start in range(len(sequence))),
+               default=0)
+
+
+def lower_bound(numbers):
+    """A move count no solution can beat, see the top of the file."""
+    order = ranks(numbers)
+    if order == sorted(order):
+        return 0
+    return max(1, len(order) - circular_lis(order))
+
+
+def reference(argv, max_exact=MAX_EXACT):
+    """Returns (moves, exact) for push_swap's arguments: the optimal move count when exact, else a lower bound.
+
+    Returns None for arguments ./checker rejects.
+    """
+    numbers = push_swap_checker.parse_numbers(argv)
+    if numbers is None:
+        return None
+    if len(numbers) <= max_exact:
+        return optimal_moves(numbers), True
+    return lower_bound(numbers), False
+
+
+def efficiency(op_count, moves):
+    """push_swap's op count over the reference move count, 1.0 is optimal."""
+    if moves == 0:
+        return 1.0 if op_count == 0 else float('inf')
+    return op_count / moves
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Optimal push_swap solutions for small inputs, lower bounds for the others.")
+    parser.add_argument("numbers", nargs="*", help="numbers to sort, like push_swap's arguments")
+    parser.add_argument("--table", type=int, metavar="N",
+                        help="print how many inputs of N numbers need each optimal move count")
+    parser.add_argument("--max-exact", type=int, default=MAX_EXACT,
+                        help="largest input solved exactly, bigger ones get a lower bound (default: {})".format(MAX_EXACT))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.table is not None:
+        table = distance_table(args.table)
+        # Only the inputs push_swap gets: everything on stack a
+        counts = Counter(moves for state, moves in table.items() if state.endswith(SEPARATOR))
+        print("{} numbers: {} states, {} inputs".format(args.table, len(table), sum(counts.values())))
+        for moves, count in sorted(counts.items()):
+            print("{:>4} moves: {:>7} inputs".format(moves, count))
+        return
+    numbers = push_swap_checker.parse_numbers(args.numbers)
+    if numbers is None:
+        print("Error")
+        exit(1)
+    if len(numbers) <= args.max_exact:
+        solution = solve(numbers)
+        print("optimal: {} moves".format(len(solution)))
+        print(" ".join(solution))
+    else:
+        print("lower bound: {} moves".format(lower_bound(numbers)))
+
+
+if __name__ == "__main__":
+    main()
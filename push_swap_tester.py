@@ -1,12 +1,25 @@
-import subprocess
 import random
 import os
+import argparse
+import itertools
+import json
+import re
+import time
+import signal
+import resource
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import push_swap_checker
+import push_swap_solver
+import tester_executor
+import norminette_cache
 OK_GREEN = '\033[92m'  # GREEN
 FAIL_RED = '\033[91m'  # RED
 ENDC = '\033[0m'  # RESET COLOR
 
 
-params = [
+edge_params = [
     "",
     " ",
     "   ",
@@ -39,115 +52,787 @@ params = [
     "-2147483649123123112",
     "-214748364812123123131312113123123123123123123"
 ]
-norminette_result = subprocess.check_output(["norminette"], universal_newlines=True)
-
-# Split the output into lines
-lines = norminette_result.split("\n")
-
-# Initialize normed_files to True
-normed_files = True
-
-# Go through each line
-for line in lines:
-    # If the line does not contain "OK!", print the filename and set normed_files to False
-    if "OK!" not in line and line.strip() != "":
-        normed_files = False
-        filename = line.split(":")[0]
-        print(FAIL_RED + filename + " is not normed!" + ENDC)
-
-# If all files are normed, print "Norm OK!"
-if normed_files:
-    print(OK_GREEN + "Norm OK!" + ENDC)
-
 min_num_params = 1
 max_num_params = 500
 min_int = -2147483648
 max_int = 2147483647
+num_random_tests = 100
+benchmark_sizes = [3, 5, 100, 500]
+# Maximum op counts accepted at grading, per input size
+default_thresholds = {3: 3, 5: 12, 100: 700, 500: 5500}
+
+# output is the checker verdict or one of the harness outcomes TIMEOUT, OOM and CRASH.
+# op_count is None when the binary checker was used, it never reports it.
+# Times are in seconds, peak RSS in KiB (None when unmeasured); the builtin checker runs
+# in the tester, it has no time or RSS of its own.
+CaseResult = namedtuple('CaseResult', ['output', 'op_count', 'elapsed', 'peak_rss',
+                                       'checker_elapsed', 'checker_peak_rss'])
+# timeout is wall-clock seconds, memory is bytes (RLIMIT_AS), cpu is seconds (RLIMIT_CPU)
+RunLimits = namedtuple('RunLimits', ['timeout', 'memory', 'cpu'])
+no_limits = RunLimits(None, None, None)
+# A crash under --memory-limit counts as OOM when push_swap's peak RSS reached this share of the limit
+OOM_RSS_SHARE = 0.5
+# Arguments shrink_case may replace by their rank
+plain_int = re.compile(r'[+-]?[0-9]+')
+
 
-if not os.path.isfile('./push_swap'):
-    print(FAIL_RED + "The file 'push_swap' does not exist!" + ENDC)
-    exit(1)
+def check_norminette(jobs=None):
+    # Only the files that changed since the last run go through norminette, the rest comes from the cache
+    report = norminette_cache.check_norm(jobs=jobs)
 
-if not os.path.isfile('./checker'):
-    print(FAIL_RED + "The file 'checker' does not exist!" + ENDC)
-    exit(1)
+    # Initialize normed_files to True
+    normed_files = True
 
-# Generate a random number of calls to make
-print(FAIL_RED + 100*'-')
-print(FAIL_RED + 'RANDOM TESTS')
-print(FAIL_RED + 100*'-')
+    # Go through each file
+    for filename, ok, _ in report:
+        # If the file is not normed, print the filename and set normed_files to False
+        if not ok:
+            normed_files = False
+            print(FAIL_RED + filename + " is not normed!" + ENDC)
 
-successful_tests = 0
-failed_tests = 0
+    # If all files are normed, print "Norm OK!"
+    if normed_files:
+        print(OK_GREEN + "Norm OK!" + ENDC)
+
+
+def generate_random_case(seed, index):
+    """Returns the random case number index of a run seeded with seed."""
+    # Every case gets its own derived seed, so it can be regenerated on its own
+    rng = random.Random("{}:case:{}".format(seed, index))
 
-for _ in range(100):
     # For each call, generate a random number of parameters
-    num_params = random.randint(min_num_params, max_num_params)
+    num_params = rng.randint(min_num_params, max_num_params)
 
     # Generate the parameters themselves
-    params = [str(random.randint(min_int, max_int)) for _ in range(num_params)]
+    return [str(rng.randint(min_int, max_int)) for _ in range(num_params)]
 
-    # Prepare the command for push_swap
-    push_swap_command = ["./push_swap"] + params
 
-    # Run push_swap and get its output
-    push_swap_result = subprocess.Popen(push_swap_command, stdout=subprocess.PIPE)
+def format_params(params, limit=80):
+    text = " ".join(params)
+    return text if len(text) <= limit else text[:limit] + "... ({} numbers)".format(len(params))
 
-    # Pipe the output of push_swap to checker
-    checker_command = ["./checker"] + params
-    checker_result = subprocess.Popen(checker_command, stdin=push_swap_result.stdout, stdout=subprocess.PIPE)
 
-    # Ensure that push_swap_result.stdout is closed when checker_result is done with it
-    push_swap_result.stdout.close()
+def load_corpus(path):
+    """Reads a JSON lines corpus, returns its entries (an empty list if the file does not exist)."""
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
 
-    # Get the final output
-    output = checker_result.communicate()[0].decode('utf-8').strip()
 
-    # Format and colorize the output
-    if output == "OK":
-        print(OK_GREEN + 'output: "{}"'.format(output) + ENDC)
-    else:
-        print(FAIL_RED + 'output: "{}"'.format(output) + ENDC)
+def record_failures(path, entries):
+    """Appends the failing cases that are not in the corpus yet, returns how many were added."""
+    known = {tuple(entry["args"]) for entry in load_corpus(path)}
+    added = 0
+    with open(path, 'a') as f:
+        for entry in entries:
+            if tuple(entry["args"]) in known:
+                continue
+            known.add(tuple(entry["args"]))
+            f.write(json.dumps(entry) + "\n")
+            added += 1
+    return added
+
 
-    if output == "OK":
-        successful_tests += 1
+def replay_corpus(path, jobs, checker, limits, prune_fixed):
+    """Reruns every corpus entry, returns the number of entries that still fail."""
+    entries = load_corpus(path)
+    print_section('REPLAY OF {} ({} cases)'.format(path, len(entries)))
+    still_failing = []
+    cases = [entry["args"] for entry in entries]
+    for entry, result in zip(entries, run_cases(cases, jobs, checker, limits)):
+        was = entry.get("output", "?")
+        if result.output == "OK":
+            print(OK_GREEN + 'output: "{}" (was "{}") | tested with: {}'.format(
+                result.output, was, format_params(entry["args"])) + ENDC)
+        else:
+            print(FAIL_RED + 'output: "{}" (was "{}") | tested with: {}'.format(
+                result.output, was, format_params(entry["args"])) + ENDC)
+            still_failing.append(dict(entry, output=result.output))
+
+    print(OK_GREEN + "Fixed: {} ".format(len(entries) - len(still_failing)) + ENDC)
+    if still_failing:
+        print(FAIL_RED + "Still failing: {} ".format(len(still_failing)) + ENDC)
     else:
-        failed_tests += 1
+        print(OK_GREEN + "Still failing: 0 " + ENDC)
+    if prune_fixed:
+        with open(path, 'w') as f:
+            for entry in still_failing:
+                f.write(json.dumps(entry) + "\n")
+        print(OK_GREEN + "Removed the fixed cases from {}".format(path) + ENDC)
+    return len(still_failing)
+
+
+def renormalise(params):
+    """Replaces the values by their rank, keeping the relative order.
+
+    Arguments that are not all plain integers (the edge cases, like "-2a") are returned unchanged.
+    """
+    if not all(plain_int.fullmatch(param) for param in params):
+        return list(params)
+    order = sorted(range(len(params)), key=lambda i: int(params[i]))
+    ranks = [0] * len(params)
+    for rank, i in enumerate(order):
+        ranks[i] = rank
+    return [str(rank) for rank in ranks]
+
+
+def shrink_case(params, target, jobs, checker="builtin", limits=no_limits):
+    """Delta-debugs params down to a small input that still makes the run end in target.
+
+    Every complement of the current split is evaluated as one parallel batch,
+    the first one that still fails (in split order) becomes the new input.
+    """
+    tried = {}
+
+    def first_reproducing(candidates):
+        candidates = [candidate for candidate in candidates if tuple(candidate) not in tried]
+        for candidate, result in zip(candidates, run_cases(candidates, jobs, checker, limits)):
+            tried[tuple(candidate)] = result.output == target
+        for candidate in candidates:
+            if tried[tuple(candidate)]:
+                return candidate
+        return None
+
+    current = list(params)
+    smaller = first_reproducing([renormalise(current)])
+    if smaller is not None:
+        current = smaller
+
+    granularity = 2
+    while len(current) >= 2:
+        chunk = -(-len(current) // granularity)
+        complements = [current[:start] + current[start + chunk:] for start in range(0, len(current), chunk)]
+        smaller = first_reproducing(complements)
+        if smaller is not None:
+            current = smaller
+            granularity = max(granularity - 1, 2)
+            continue
+        if granularity >= len(current):
+            break
+        granularity = min(len(current), granularity * 2)
+
+    # Smaller values make the reproducer easier to read, keep them if the failure survives
+    smaller = first_reproducing([renormalise(current)])
+    if smaller is not None:
+        current = smaller
+    return current, len(tried)
+
+
+def shrink_corpus(path, shrunk_path, jobs, checker, limits):
+    """Shrinks every failing entry of a corpus and appends the minimal reproducers to shrunk_path."""
+    entries = load_corpus(path)
+    print_section('SHRINKING {} ({} cases)'.format(path, len(entries)))
+    minimal = []
+    for entry in entries:
+        start = time.perf_counter()
+        target = run_case(entry["args"], checker, limits).output
+        if target == "OK":
+            print(OK_GREEN + 'passes now, skipped | tested with: {}'.format(format_params(entry["args"])) + ENDC)
+            continue
+        shrunk, evaluated = shrink_case(entry["args"], target, jobs, checker, limits)
+        print(FAIL_RED + 'output: "{}" | {} -> {} numbers in {:.1f}s ({} runs) | reproducer: {}'.format(
+            target, len(entry["args"]), len(shrunk), time.perf_counter() - start, evaluated,
+            format_params(shrunk)) + ENDC)
+        minimal.append(dict(entry, output=target, original_size=len(entry["args"]), args=shrunk))
+    if minimal:
+        added = record_failures(shrunk_path, minimal)
+        print(OK_GREEN + "Saved {} new reproducer(s) to {}".format(added, shrunk_path) + ENDC)
 
-print(FAIL_RED + 100*'-')
-print(FAIL_RED + 'OTHER TESTS')
-print(FAIL_RED + 100*'-')
-for param in params:
+
+def resource_limiter(limits):
+    """Returns a preexec_fn that applies the RLIMIT_AS/RLIMIT_CPU caps in the child."""
+    def apply_limits():
+        if limits.memory:
+            resource.setrlimit(resource.RLIMIT_AS, (limits.memory, limits.memory))
+        if limits.cpu:
+            # SIGXCPU at the soft limit, the SIGKILL of the hard one only if it is ignored
+            resource.setrlimit(resource.RLIMIT_CPU, (limits.cpu, limits.cpu + 1))
+    return apply_limits
+
+
+def classify_exit(returncode, peak_rss, limits, timed_out):
+    """Returns TIMEOUT, OOM or CRASH for abnormal exits, None when the process exited normally."""
+    if timed_out or returncode == -signal.SIGXCPU or (limits.cpu and returncode == -signal.SIGKILL):
+        return "TIMEOUT"
+    # A SIGPIPE only means the checker stopped reading early, it decided the verdict already
+    if returncode >= 0 or returncode == -signal.SIGPIPE:
+        return None
+    # The kernel OOM killer sends SIGKILL
+    if returncode == -signal.SIGKILL:
+        return "OOM"
+    # Failed allocations under RLIMIT_AS usually end in SIGSEGV/SIGABRT, so does a plain bug:
+    # only a process that actually used most of the limit ran out of memory
+    if (limits.memory and returncode in (-signal.SIGSEGV, -signal.SIGABRT) and peak_rss is not None
+            and peak_rss * 1024 >= limits.memory * OOM_RSS_SHARE):
+        return "OOM"
+    return "CRASH"
+
+
+def run_case(params, checker="builtin", limits=no_limits):
+    """Runs push_swap with params and checks its output, returns a CaseResult."""
     # Prepare the command for push_swap
-    push_swap_command = ["./push_swap", param]
+    push_swap_command = ["./push_swap"] + params
+    preexec_fn = resource_limiter(limits) if limits.memory or limits.cpu else None
+
+    if checker == "builtin":
+        # Feed the instructions to the in-process checker chunk by chunk as push_swap writes them
+        builtin = push_swap_checker.StreamChecker(params)
+        result = tester_executor.run(push_swap_command, timeout=limits.timeout, preexec_fn=preexec_fn,
+                                     stdout=builtin.write, stderr=None)
+        output, op_count = builtin.result()
+        push_swap_result = result.processes[0]
+        checker_elapsed = checker_peak_rss = None
+    else:
+        # Pipe the output of push_swap to checker, checker reports "Error" on stderr
+        checker_command = ["./checker"] + params
+        result = tester_executor.run([push_swap_command, checker_command], timeout=limits.timeout,
+                                     preexec_fn=preexec_fn, stderr=tester_executor.STDOUT)
+        output = result.stdout.decode('utf-8', errors='replace').strip()
+        op_count = None
+        push_swap_result, checker_result = result.processes
+        checker_elapsed, checker_peak_rss = checker_result.elapsed, checker_result.peak_rss
+
+    outcome = classify_exit(push_swap_result.returncode, push_swap_result.peak_rss, limits,
+                            result.timed_out)
+    if outcome is None and checker != "builtin":
+        outcome = classify_exit(checker_result.returncode, checker_peak_rss, limits, False)
+    if outcome is not None:
+        output = outcome
+    return CaseResult(output, op_count, push_swap_result.elapsed, push_swap_result.peak_rss,
+                      checker_elapsed, checker_peak_rss)
+
+
+def verify_case(params, limits=no_limits):
+    """Runs a case through both checkers, returns (builtin output, ./checker output)."""
+    return run_case(params, "builtin", limits).output, run_case(params, "binary", limits).output
+
+
+def run_cases(cases, jobs, checker="builtin", limits=no_limits):
+    """Yields the CaseResult of every case, in case order, using up to jobs workers."""
+    run = partial(run_case, checker=checker, limits=limits)
+    if jobs <= 1:
+        for params in cases:
+            yield run(params)
+        return
+    # executor.map hands back results in submission order, whatever order they finish in
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(run, cases)
+
+
+def verify_checker(cases, jobs, rate, seed, limits=no_limits):
+    """Cross-checks the builtin checker against ./checker on a sample of cases, returns the mismatch count."""
+    rng = random.Random("{}:verify".format(seed))
+    sample = [params for params in cases if rng.random() < rate]
+    print_section('CHECKER VERIFICATION ({} cases)'.format(len(sample)))
+    mismatches = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for params, (builtin, binary) in zip(sample, executor.map(partial(verify_case, limits=limits), sample)):
+            if builtin != binary:
+                mismatches += 1
+                print(FAIL_RED + 'checker mismatch: builtin "{}" vs ./checker "{}" | tested with: {}'.format(
+                    builtin, binary, " ".join(params)) + ENDC)
+    if mismatches == 0:
+        print(OK_GREEN + "Builtin checker agrees with ./checker" + ENDC)
+    return mismatches
+
+
+def percentile(sorted_values, p):
+    """Linearly interpolated percentile (0-100) of an already sorted list."""
+    if len(sorted_values) == 1:
+        return float(sorted_values[0])
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def generate_permutation(size, seed, run):
+    """Returns a reproducible list of size distinct ints for the given seed and run number."""
+    rng = random.Random("{}:{}:{}".format(seed, size, run))
+    return [str(n) for n in rng.sample(range(min_int, max_int + 1), size)]
+
+
+def summarize_op_counts(op_counts, times):
+    op_counts = sorted(op_counts)
+    return {
+        "min": op_counts[0],
+        "mean": sum(op_counts) / len(op_counts),
+        "p50": percentile(op_counts, 50),
+        "p95": percentile(op_counts, 95),
+        "max": op_counts[-1],
+        "mean_time": sum(times) / len(times),
+        "max_time": max(times),
+    }
+
+
+def run_benchmark(sizes, runs, seed, thresholds, jobs, limits=no_limits):
+    """Runs every size with runs seeded permutations, returns the results as a dict."""
+    results = {"seed": seed, "runs": runs, "thresholds": thresholds, "sizes": {}}
+    for size in sizes:
+        cases = [generate_permutation(size, seed, run) for run in range(runs)]
+        case_results = list(run_cases(cases, jobs, limits=limits))
+        op_counts = [result.op_count for result in case_results]
+        times = [result.elapsed for result in case_results]
+        limit = thresholds.get(size)
+        over_threshold = [run for run, ops in enumerate(op_counts) if limit is not None and ops > limit]
+        failed = [run for run, result in enumerate(case_results) if result.output != "OK"]
+        results["sizes"][str(size)] = {
+            "stats": summarize_op_counts(op_counts, times),
+            "op_counts": op_counts,
+            "times": times,
+            "failed_runs": failed,
+            "over_threshold_runs": over_threshold,
+            "efficiency": summarize_efficiency(cases, op_counts),
+        }
+    return results
+
+
+def summarize_efficiency(cases, op_counts):
+    """Compares op counts with the solver's optimum (small sizes) or lower bound (the others)."""
+    references = [push_swap_solver.reference(params) for params in cases]
+    moves = [reference[0] for reference in references]
+    ratios = [push_swap_solver.efficiency(ops, reference) for ops, reference in zip(op_counts, moves)]
+    worst = max(range(len(ratios)), key=lambda run: ratios[run])
+    return {
+        "exact": references[0][1],
+        "reference_moves": moves,
+        "mean_reference": sum(moves) / len(moves),
+        "mean_ratio": sum(ratios) / len(ratios),
+        "max_ratio": ratios[worst],
+        "worst_run": worst,
+        "mean_wasted": sum(ops - reference for ops, reference in zip(op_counts, moves)) / len(moves),
+    }
+
 
-    # Run push_swap and get its output
-    push_swap_result = subprocess.Popen(push_swap_command, stdout=subprocess.PIPE)
+def print_benchmark(results, baseline=None):
+    print_section('BENCHMARK (seed {}, {} runs per size)'.format(results["seed"], results["runs"]))
+    print("{:>6} {:>7} {:>9} {:>8} {:>8} {:>7} {:>11} {:>10}".format(
+        "size", "min", "mean", "p50", "p95", "max", "mean time", "threshold"))
+    for size, entry in results["sizes"].items():
+        stats = entry["stats"]
+        limit = results["thresholds"].get(int(size))
+        color = FAIL_RED if entry["over_threshold_runs"] or entry["failed_runs"] else OK_GREEN
+        print(color + "{:>6} {:>7} {:>9.1f} {:>8.1f} {:>8.1f} {:>7} {:>10.3f}s {:>10}".format(
+            size, stats["min"], stats["mean"], stats["p50"], stats["p95"], stats["max"],
+            stats["mean_time"], limit if limit is not None else "-") + ENDC)
+        if entry["over_threshold_runs"]:
+            worst = max(entry["over_threshold_runs"], key=lambda run: entry["op_counts"][run])
+            print(FAIL_RED + "  {}/{} runs over the {} threshold (worst: run {} with {} ops)".format(
+                len(entry["over_threshold_runs"]), results["runs"], limit, worst, entry["op_counts"][worst]) + ENDC)
+        if entry["failed_runs"]:
+            print(FAIL_RED + "  {}/{} runs not sorted: {}".format(
+                len(entry["failed_runs"]), results["runs"], entry["failed_runs"]) + ENDC)
 
-    # Pipe the output of push_swap to checker
-    checker_command = ["./checker", param]
-    checker_result = subprocess.Popen(checker_command, stdin=push_swap_result.stdout, stdout=subprocess.PIPE)
+    print_efficiency(results)
 
-    # Ensure that push_swap_result.stdout is closed when checker_result is done with it
-    push_swap_result.stdout.close()
+    if baseline is None:
+        return
+    print_section('COMPARED TO BASELINE (seed {})'.format(baseline["seed"]))
+    for size, entry in results["sizes"].items():
+        if size not in baseline["sizes"]:
+            print("{:>6} not in baseline".format(size))
+            continue
+        old = baseline["sizes"][size]["stats"]
+        new = entry["stats"]
+        color = FAIL_RED if new["mean"] > old["mean"] else OK_GREEN
+        print(color + "{:>6} mean {:.1f} -> {:.1f} ({:+.1f})   p95 {:.1f} -> {:.1f} ({:+.1f})   max {} -> {}".format(
+            size, old["mean"], new["mean"], new["mean"] - old["mean"],
+            old["p95"], new["p95"], new["p95"] - old["p95"], old["max"], new["max"]) + ENDC)
 
-    # Get the final output
-    output = checker_result.communicate()[0].decode('utf-8').strip()
 
-    # Format and colorize the output
-    if output == "OK":
-        print(OK_GREEN + 'output: "{}" | tested with: {}'.format(output, param) + ENDC)
+def exhaustive_cases(max_size, rotation_sizes):
+    """Every ordering of 1 to max_size numbers, then every rotation of sorted input for rotation_sizes.
+
+    Cases are relative orders (ranks), an order already listed is not listed again.
+    """
+    orders = {}
+    for size in range(1, max_size + 1):
+        for order in itertools.permutations(range(size)):
+            orders.setdefault(order, None)
+    for size in rotation_sizes:
+        for shift in range(size):
+            orders.setdefault(tuple(range(shift, size)) + tuple(range(shift)), None)
+    return [[str(rank) for rank in order] for order in orders]
+
+
+def run_exhaustive(max_size, rotation_sizes, jobs, checker, thresholds, limits=no_limits):
+    """Runs every exhaustive case and prints op counts and failures per size, returns the failing cases."""
+    cases = exhaustive_cases(max_size, rotation_sizes)
+    print_section('EXHAUSTIVE SWEEP (every ordering up to {} numbers, rotations of {}: {} cases)'.format(
+        max_size, ",".join(map(str, rotation_sizes)) or "-", len(cases)))
+    start = time.perf_counter()
+    by_size = {}
+    for params, result in zip(cases, run_cases(cases, jobs, checker, limits)):
+        by_size.setdefault(len(params), []).append((params, result))
+
+    failures = []
+    print("{:>6} {:>7} {:>7} {:>7} {:>9} {:>7} {:>8} {:>10}".format(
+        "size", "cases", "OK", "failed", "mean ops", "max", "optimal", "threshold"))
+    for size, entries in sorted(by_size.items()):
+        failed = [(params, result) for params, result in entries if result.output != "OK"]
+        op_counts = [result.op_count for _, result in entries if result.op_count is not None]
+        limit = thresholds.get(size)
+        over = [ops for ops in op_counts if limit is not None and ops > limit]
+        optimal = max(push_swap_solver.distance_table(size)[push_swap_solver.encode(map(int, params))]
+                      for params, _ in entries) if size <= push_swap_solver.MAX_EXACT and len(entries) > 1 else None
+        color = FAIL_RED if failed or over else OK_GREEN
+        print(color + "{:>6} {:>7} {:>7} {:>7} {:>9} {:>7} {:>8} {:>10}".format(
+            size, len(entries), len(entries) - len(failed), len(failed),
+            "{:.1f}".format(sum(op_counts) / len(op_counts)) if op_counts else "-",
+            max(op_counts) if op_counts else "-", optimal if optimal is not None else "-",
+            limit if limit is not None else "-") + ENDC)
+        if over:
+            worst_params, worst = max(entries, key=lambda entry: entry[1].op_count or 0)
+            print(FAIL_RED + "  {}/{} orderings over the {} threshold (worst: {} with {} ops)".format(
+                len(over), len(entries), limit, format_params(worst_params), worst.op_count) + ENDC)
+        for params, result in failed[:5]:
+            print(FAIL_RED + '  output: "{}" | tested with: {}'.format(result.output, format_params(params)) + ENDC)
+        if len(failed) > 5:
+            print(FAIL_RED + "  ... and {} more".format(len(failed) - 5) + ENDC)
+        failures += [{"case": "exhaustive", "output": result.output, "args": params} for params, result in failed]
+    print("Swept {} cases in {:.1f}s".format(len(cases), time.perf_counter() - start))
+    return failures
+
+
+def print_efficiency(results):
+    """Prints op counts against the reference move counts, the size wasting the most moves first."""
+    print_section('EFFICIENCY (op count / reference moves, 1.00 is optimal)')
+    print("{:>6} {:>12} {:>10} {:>10} {:>10} {:>12}".format(
+        "size", "reference", "mean ref", "mean", "worst", "wasted ops"))
+    sizes = sorted(results["sizes"].items(), key=lambda item: item[1]["efficiency"]["mean_ratio"], reverse=True)
+    for size, entry in sizes:
+        efficiency = entry["efficiency"]
+        print("{:>6} {:>12} {:>10.1f} {:>9.2f}x {:>9.2f}x {:>12.1f}".format(
+            size, "optimal" if efficiency["exact"] else "lower bound", efficiency["mean_reference"],
+            efficiency["mean_ratio"], efficiency["max_ratio"], efficiency["mean_wasted"]))
+    print("Lower bounds are far below the optimum for big sizes, their ratios overstate the waste; "
+          "only sizes up to {} are exact.".format(push_swap_solver.MAX_EXACT))
+
+
+def mutate(params, rng):
+    """Returns a copy of params with one random swap, reversal or block move applied."""
+    child = list(params)
+    if len(child) < 2:
+        return child
+    i, j = sorted(rng.sample(range(len(child) + 1), 2))
+    kind = rng.randrange(3)
+    if kind == 0:
+        # Swap two elements
+        k, l = i, min(j, len(child) - 1)
+        child[k], child[l] = child[l], child[k]
+    elif kind == 1:
+        # Reverse a slice
+        child[i:j] = reversed(child[i:j])
     else:
-        print(FAIL_RED + 'output: "{}" | tested with: {}'.format(output, param) + ENDC)
+        # Move a block somewhere else
+        block = child[i:j]
+        del child[i:j]
+        insert_at = rng.randrange(len(child) + 1)
+        child[insert_at:insert_at] = block
+    return child
+
+
+def case_score(result, objective):
+    return result.elapsed if objective == "time" else result.op_count
+
+
+def search_worst_cases(size, generations, population_size, top, objective, seed, jobs, limits=no_limits):
+    """Evolves permutations of size numbers that maximise the op count (or runtime) of push_swap.
+
+    Returns the top worst (score, params, result) tuples found, worst first.
+    """
+    rng = random.Random("{}:search:{}".format(seed, size))
+    population = [generate_permutation(size, seed, run) for run in range(population_size)]
+    scored = {}
+
+    def evaluate(batch):
+        batch = [params for params in batch if tuple(params) not in scored]
+        for params, result in zip(batch, run_cases(batch, jobs, limits=limits)):
+            scored[tuple(params)] = (case_score(result, objective), params, result)
+
+    evaluate(population)
+    for generation in range(generations):
+        ranked = sorted((scored[tuple(params)] for params in population), key=lambda entry: entry[0], reverse=True)
+        # The worse half survives and breeds the next batch of candidates
+        parents = [params for _, params, _ in ranked[:max(1, population_size // 2)]]
+        children = [mutate(rng.choice(parents), rng) for _ in range(population_size)]
+        evaluate(children)
+        candidates = {tuple(params): params for params in parents + children}
+        population = sorted(candidates.values(), key=lambda params: scored[tuple(params)][0], reverse=True)
+        population = population[:population_size]
+        best = scored[tuple(population[0])]
+        print("generation {:>3}: worst {} {}, population mean {:.1f}".format(
+            generation + 1, objective, best[0],
+            sum(scored[tuple(params)][0] for params in population) / len(population)))
+
+    return sorted(scored.values(), key=lambda entry: entry[0], reverse=True)[:top]
+
+
+def write_search_corpus(path, size, objective, seed, worst):
+    """Appends the worst cases to a JSON lines corpus, one input per line."""
+    with open(path, 'a') as f:
+        for score, params, result in worst:
+            f.write(json.dumps({
+                "size": size,
+                "objective": objective,
+                "score": score,
+                "op_count": result.op_count,
+                "output": result.output,
+                "seed": seed,
+                "args": params,
+            }) + "\n")
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def parse_threshold(value):
+    size, limit = value.split(":")
+    return int(size), int(limit)
+
+
+def merge_thresholds(overrides):
+    """Returns the default operation limits with the --threshold SIZE:LIMIT overrides applied."""
+    thresholds = dict(default_thresholds)
+    thresholds.update(overrides)
+    return thresholds
+
+
+def require_binary(name):
+    """Exits when ./name was not built."""
+    if not os.path.isfile('./' + name):
+        print(FAIL_RED + "The file '{}' does not exist!".format(name) + ENDC)
+        exit(1)
 
-    if output == "OK":
-        successful_tests += 1
+
+def print_distribution(label, values, unit, fmt):
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return
+    print(("{:<22} min " + fmt + "{}   p50 " + fmt + "{}   p95 " + fmt + "{}   max " + fmt + "{}").format(
+        label, values[0], unit, percentile(values, 50), unit, percentile(values, 95), unit, values[-1], unit))
+
+
+def print_resource_summary(results):
+    """Prints the latency and peak RSS distributions of push_swap and checker.
+
+    The rows nothing was measured for are skipped, like the checker's with the builtin checker.
+    """
+    print_distribution("push_swap time:", [result.elapsed for result in results], "s", "{:.3f}")
+    print_distribution("push_swap peak RSS:", [result.peak_rss for result in results], "KiB", "{:.0f}")
+    print_distribution("checker time:", [result.checker_elapsed for result in results], "s", "{:.3f}")
+    print_distribution("checker peak RSS:", [result.checker_peak_rss for result in results], "KiB", "{:.0f}")
+
+
+def print_section(title):
+    print(FAIL_RED + 100*'-')
+    print(FAIL_RED + title)
+    print(FAIL_RED + 100*'-')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tests ./push_swap against ./checker.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of push_swap | checker pipelines to run at the same time (default: 1)")
+    parser.add_argument("--checker", choices=["builtin", "binary"], default="builtin",
+                        help="check push_swap output in-process (builtin) or through ./checker (default: builtin)")
+    parser.add_argument("--verify-checker", type=float, default=0.0, metavar="RATE",
+                        help="fraction of cases (0-1) to also run through ./checker to cross-check the builtin one")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="wall-clock seconds before a run is killed and reported as TIMEOUT, 0 disables (default: 10)")
+    parser.add_argument("--memory-limit", type=int, default=0, metavar="MB",
+                        help="RLIMIT_AS cap for push_swap and checker in MB, 0 disables (default: 0)")
+    parser.add_argument("--cpu-limit", type=int, default=0, metavar="SECONDS",
+                        help="RLIMIT_CPU cap for push_swap and checker in seconds, 0 disables (default: 0)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="report op count statistics over seeded permutations instead of running the tests")
+    parser.add_argument("--sizes", type=parse_sizes, default=benchmark_sizes,
+                        help="comma separated input sizes to benchmark (default: 3,5,100,500)")
+    parser.add_argument("--runs", type=int, default=20,
+                        help="number of permutations per size in benchmark mode (default: 20)")
+    parser.add_argument("--seed", type=int,
+                        help="seed every generated case derives from "
+                             "(default: a fresh seed for the tests, 0 for --benchmark and --search)")
+    parser.add_argument("--failures", default="push_swap_failures.jsonl",
+                        help="corpus file failing cases are appended to (default: push_swap_failures.jsonl)")
+    parser.add_argument("--replay", nargs="?", const=True, metavar="PATH",
+                        help="only rerun the cases of a corpus (default: the --failures file)")
+    parser.add_argument("--shrink", nargs="?", const=True, metavar="PATH",
+                        help="shrink the cases of a corpus to minimal reproducers (default: the --failures file)")
+    parser.add_argument("--shrunk", default="push_swap_minimal.jsonl",
+                        help="file the minimal reproducers are appended to (default: push_swap_minimal.jsonl)")
+    parser.add_argument("--prune-fixed", action="store_true",
+                        help="with --replay, remove the cases that pass now from the corpus")
+    parser.add_argument("--threshold", type=parse_threshold, action="append", default=[], metavar="SIZE:MAX",
+                        help="flag runs of SIZE numbers using more than MAX ops, can be repeated "
+                             "(default: 3:3 5:12 100:700 500:5500)")
+    parser.add_argument("--exhaustive", type=int, nargs="?", const=6, metavar="N",
+                        help="run every ordering of 1 to N numbers (default: 6) instead of the random tests")
+    parser.add_argument("--rotations", type=parse_sizes, default=[], metavar="SIZES",
+                        help="with --exhaustive, also run every rotation of sorted input of these comma separated sizes")
+    parser.add_argument("--search", type=int, metavar="SIZE",
+                        help="search for SIZE number inputs that make push_swap emit the most ops")
+    parser.add_argument("--generations", type=int, default=30,
+                        help="number of search generations (default: 30)")
+    parser.add_argument("--population", type=int, default=16,
+                        help="number of candidates evaluated per search generation (default: 16)")
+    parser.add_argument("--objective", choices=["ops", "time"], default="ops",
+                        help="what the search maximises (default: ops)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of worst inputs the search keeps (default: 10)")
+    parser.add_argument("--corpus", default="push_swap_corpus.jsonl",
+                        help="file the search appends its worst inputs to (default: push_swap_corpus.jsonl)")
+    parser.add_argument("--json", metavar="PATH", help="save the benchmark results to PATH")
+    parser.add_argument("--efficiency", action="store_true",
+                        help="compare the op count of every passing random test with the optimal solution "
+                             "(up to {} numbers) or a lower bound".format(push_swap_solver.MAX_EXACT))
+    parser.add_argument("--compare", metavar="PATH", help="compare the benchmark against results saved with --json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.jobs < 1:
+        print(FAIL_RED + "--jobs must be at least 1" + ENDC)
+        exit(1)
+    # Every push_swap and checker runs on the shared engine, Ctrl-C kills them all
+    tester_executor.configure(args.jobs)
+
+    limits = RunLimits(args.timeout or None, args.memory_limit * 1024 * 1024 or None, args.cpu_limit or None)
+    if args.seed is None:
+        args.seed = 0 if args.benchmark or args.search else random.randrange(2**32)
+
+    if args.replay or args.shrink or args.benchmark or args.search or args.exhaustive:
+        require_binary('push_swap')
+
+    if args.replay:
+        corpus = args.failures if args.replay is True else args.replay
+        replay_corpus(corpus, args.jobs, args.checker, limits, args.prune_fixed)
+        return
+
+    if args.shrink:
+        corpus = args.failures if args.shrink is True else args.shrink
+        shrink_corpus(corpus, args.shrunk, args.jobs, args.checker, limits)
+        return
+
+    if args.exhaustive:
+        if args.checker == "binary":
+            require_binary('checker')
+        failures = run_exhaustive(args.exhaustive, [size for size in args.rotations if size > args.exhaustive],
+                                  args.jobs, args.checker, merge_thresholds(args.threshold), limits)
+        if failures:
+            added = record_failures(args.failures, failures)
+            print(FAIL_RED + "Recorded {} new failing case(s) in {}, rerun them with --replay".format(
+                added, args.failures) + ENDC)
+        return
+
+    if args.search:
+        print_section('WORST CASE SEARCH (size {}, seed {})'.format(args.search, args.seed))
+        worst = search_worst_cases(args.search, args.generations, args.population, args.top,
+                                   args.objective, args.seed, args.jobs, limits)
+        limit = merge_thresholds(args.threshold).get(args.search)
+        for score, params, result in worst:
+            color = FAIL_RED if result.output != "OK" or (limit is not None and result.op_count > limit) else OK_GREEN
+            print(color + 'output: "{}" | ops: {} | time: {:.3f}s'.format(
+                result.output, result.op_count, result.elapsed) + ENDC)
+        write_search_corpus(args.corpus, args.search, args.objective, args.seed, worst)
+        print(OK_GREEN + "Saved the {} worst inputs to {}".format(len(worst), args.corpus) + ENDC)
+        return
+
+    if args.benchmark:
+        results = run_benchmark(args.sizes, args.runs, args.seed, merge_thresholds(args.threshold), args.jobs, limits)
+        baseline = None
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        print_benchmark(results, baseline)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(OK_GREEN + "Benchmark results saved to {}".format(args.json) + ENDC)
+        return
+
+    check_norminette(args.jobs)
+
+    require_binary('push_swap')
+    if args.checker == "binary" or args.verify_checker > 0:
+        require_binary('checker')
+
+    successful_tests = 0
+    failed_tests = 0
+    all_results = []
+    failures = []
+
+    # Generate a random number of calls to make
+    print_section('RANDOM TESTS (seed {})'.format(args.seed))
+    random_cases = [generate_random_case(args.seed, index) for index in range(num_random_tests)]
+    efficiencies = []
+    for index, (params, result) in enumerate(zip(random_cases, run_cases(random_cases, args.jobs, args.checker, limits))):
+        all_results.append(result)
+        output = result.output
+        # Format and colorize the output
+        if output == "OK":
+            if args.efficiency and result.op_count is not None:
+                moves, exact = push_swap_solver.reference(params)
+                ratio = push_swap_solver.efficiency(result.op_count, moves)
+                efficiencies.append((ratio, index, params, result.op_count, moves, exact))
+                print(OK_GREEN + 'output: "{}" | ops: {} | {}: {} | {:.2f}x'.format(
+                    output, result.op_count, "optimal" if exact else "lower bound", moves, ratio) + ENDC)
+            else:
+                print(OK_GREEN + 'output: "{}"'.format(output) + ENDC)
+            successful_tests += 1
+        else:
+            print(FAIL_RED + 'output: "{}" | case {} | tested with: {}'.format(
+                output, index, format_params(params)) + ENDC)
+            failed_tests += 1
+            failures.append({"seed": args.seed, "case": index, "output": output, "args": params})
+
+    print_section('OTHER TESTS')
+    edge_cases = [[param] for param in edge_params]
+    for param, result in zip(edge_params, run_cases(edge_cases, args.jobs, args.checker, limits)):
+        all_results.append(result)
+        output = result.output
+        # Format and colorize the output
+        if output == "OK":
+            print(OK_GREEN + 'output: "{}" | tested with: {}'.format(output, param) + ENDC)
+            successful_tests += 1
+        else:
+            print(FAIL_RED + 'output: "{}" | tested with: {}'.format(output, param) + ENDC)
+            failed_tests += 1
+            # Invalid input is supposed to end in Error, only keep the cases that misbehaved otherwise
+            if output not in ("Error", ""):
+                failures.append({"seed": args.seed, "case": "edge", "output": output, "args": [param]})
+
+    mismatches = 0
+    if args.verify_checker > 0:
+        mismatches = verify_checker(random_cases + edge_cases, args.jobs, args.verify_checker, args.seed, limits)
+
+    print(OK_GREEN + "Summary:" + ENDC)
+    print(OK_GREEN + "Successful tests: {} ".format(successful_tests) + ENDC)
+    if failed_tests > 0:
+        print(FAIL_RED + "Failed tests: {} ".format(failed_tests) + ENDC)
     else:
-        failed_tests += 1
-
-print(OK_GREEN + "Summary:" + ENDC)
-print(OK_GREEN + "Successful tests: {} ".format(successful_tests) + ENDC)
-if failed_tests > 0:
-    print(FAIL_RED + "Failed tests: {} ".format(failed_tests) + ENDC)
-else:
-    print(OK_GREEN + "Failed tests: {} ".format(failed_tests) + ENDC)
\ No newline at end of file
+        print(OK_GREEN + "Failed tests: {} ".format(failed_tests) + ENDC)
+    for outcome in ["TIMEOUT", "OOM", "CRASH"]:
+        count = sum(1 for result in all_results if result.output == outcome)
+        if count > 0:
+            print(FAIL_RED + "{}: {} ".format(outcome, count) + ENDC)
+    if mismatches > 0:
+        print(FAIL_RED + "Checker mismatches: {} ".format(mismatches) + ENDC)
+    print_resource_summary(all_results)
+    if efficiencies:
+        print(OK_GREEN + "Most wasted moves (op count / reference):" + ENDC)
+        for ratio, index, params, op_count, moves, exact in sorted(efficiencies, key=lambda entry: entry[0], reverse=True)[:5]:
+            print("  {:.2f}x  case {} ({} numbers): {} ops, {} {}".format(
+                ratio, index, len(push_swap_checker.parse_numbers(params)), op_count,
+                "optimal" if exact else "lower bound", moves))
+    if failures:
+        added = record_failures(args.failures, failures)
+        print(FAIL_RED + "Recorded {} new failing case(s) in {}, rerun them with --replay".format(
+            added, args.failures) + ENDC)
+
+
+if __name__ == "__main__":
+    main()
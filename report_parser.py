@@ -0,0 +1,375 @@
+import contextlib
+import re
+import xml.etree.ElementTree as ET
+
+# Streaming parsers for valgrind (memcheck XML, helgrind/drd text logs) and
+# AddressSanitizer/ThreadSanitizer/LeakSanitizer reports. Every parser reads its
+# input one line (or one XML element) at a time, so huge logs are never loaded
+# whole, and returns a summary dict:
+#
+#   {"tool": ..., "error_count": ..., "errors": [{"kind", "count", "bytes", "signature", "frames"}, ...],
+#    "leaks": {"definitely lost": {"bytes": ..., "blocks": ...}, ...}}
+#
+# Errors are deduplicated by kind and stack signature, so the same race reported
+# a thousand times shows up once with its count.
+
+# Number of innermost frames that identify an error's stack
+SIGNATURE_DEPTH = 5
+
+valgrind_prefix = re.compile(r'^(?:==|--)\d+(?:==|--) ?')
+valgrind_frame = re.compile(r'^\s*(?:at|by) 0x[0-9A-Fa-f]+: (.+?)(?: \((.*)\))?$')
+valgrind_leak = re.compile(r'^\s*(definitely lost|indirectly lost|possibly lost|still reachable|suppressed): '
+                           r'([\d,]+) bytes in ([\d,]+) blocks')
+valgrind_bytes = re.compile(r'([\d,]+) (?:\([\d,]+ direct, [\d,]+ indirect\) )?bytes in')
+sanitizer_header = re.compile(r'^(?:==\d+==)?(?:ERROR|WARNING): (\w+Sanitizer): (.+)$')
+sanitizer_frame = re.compile(r'^\s*#\d+ 0x[0-9A-Fa-f]+ in (\S+)(?: (.*))?$')
+sanitizer_leak = re.compile(r'^(Direct|Indirect) leak of (\d+) byte\(s\) in (\d+) object\(s\)')
+# Lines that open a block of context for the previous error, not a new error
+valgrind_context = ('Address ', 'Block was alloc', 'Lock at ', 'This conflicts', 'Other segment',
+                    'Uninitialised value was created')
+# Informational lines that are never an error header
+valgrind_info = ('Thread #', '---', 'HEAP SUMMARY', 'LEAK SUMMARY', 'ERROR SUMMARY', 'Locks held',
+                 'in use at exit', 'total heap usage')
+
+
+def open_lines(source):
+    """Returns a context manager over the lines of source, a path or an iterable of lines."""
+    if isinstance(source, str):
+        return open(source, errors='replace')
+    return contextlib.nullcontext(source)
+
+
+def normalize_kind(text):
+    """Strips addresses, sizes and thread numbers so identical errors get the same kind."""
+    text = re.sub(r'0x[0-9A-Fa-f]+', 'ADDR', text)
+    text = re.sub(r'\(pid=\d+\)', '', text)
+    return re.sub(r'\d[\d,]*', 'N', text).strip()
+
+
+class ErrorTable:
+    """Collects errors, deduplicated by (kind, stack signature)."""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.errors = {}
+        self.error_count = 0
+        self.leaks = {}
+
+    def add(self, kind, frames, leaked_bytes=0):
+        signature = " < ".join(frames[:SIGNATURE_DEPTH])
+        entry = self.errors.setdefault((kind, signature), {
+            "kind": kind, "count": 0, "bytes": 0, "signature": signature, "frames": frames[:SIGNATURE_DEPTH]})
+        entry["count"] += 1
+        entry["bytes"] += leaked_bytes
+        self.error_count += 1
+
+    def add_leak(self, category, leaked_bytes, blocks):
+        leak = self.leaks.setdefault(category, {"bytes": 0, "blocks": 0})
+        leak["bytes"] += leaked_bytes
+        leak["blocks"] += blocks
+
+    def summary(self):
+        errors = sorted(self.errors.values(), key=lambda entry: entry["count"], reverse=True)
+        return {"tool": self.tool, "error_count": self.error_count, "errors": errors, "leaks": self.leaks}
+
+
+def parse_memcheck_xml(path):
+    """Parses a memcheck --xml=yes report."""
+    table = ErrorTable("memcheck")
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag != "error":
+            continue
+        kind = elem.findtext("kind", "Unknown")
+        frames = [frame.findtext("fn", "???") for frame in elem.iterfind("stack/frame")]
+        leaked_bytes = int(elem.findtext("xwhat/leakedbytes", "0"))
+        table.add(kind, frames, leaked_bytes)
+        if kind.startswith("Leak_"):
+            # Leak_DefinitelyLost -> definitely lost, like the text summary
+            category = re.sub(r'(?<!^)([A-Z])', r' \1', kind[len("Leak_"):]).lower()
+            table.add_leak(category, leaked_bytes, int(elem.findtext("xwhat/leakedblocks", "0")))
+        # Drop the finished element, the tree would otherwise keep growing
+        elem.clear()
+    return table.summary()
+
+
+def parse_valgrind_log(source, tool):
+    """Parses a valgrind text report (helgrind, drd or memcheck without --xml), from a path or lines."""
+    table = ErrorTable(tool)
+    header = None
+    frames = []
+    leaked_bytes = 0
+    in_stack = False
+
+    def flush():
+        if header is not None and frames:
+            table.add(normalize_kind(header), frames, leaked_bytes)
+
+    with open_lines(source) as f:
+        for line in f:
+            if not valgrind_prefix.match(line):
+                continue
+            text = valgrind_prefix.sub('', line.rstrip('\n'))
+            leak = valgrind_leak.match(text)
+            if leak:
+                table.add_leak(leak.group(1), int(leak.group(2).replace(',', '')), int(leak.group(3).replace(',', '')))
+                continue
+            if not text.strip():
+                # A blank line ends the current error block
+                flush()
+                header, frames, leaked_bytes, in_stack = None, [], 0, False
+                continue
+            frame = valgrind_frame.match(text)
+            if frame:
+                if in_stack:
+                    frames.append(frame.group(1))
+                continue
+            if text.lstrip().startswith(valgrind_info):
+                continue
+            if header is None:
+                if text.lstrip().startswith(valgrind_context):
+                    continue
+                header, in_stack = text, True
+                size = valgrind_bytes.search(text)
+                leaked_bytes = int(size.group(1).replace(',', '')) if size and "lost" in text else 0
+            elif text.lstrip().startswith(valgrind_context):
+                # Context frames (where the block was allocated...) are not part of the signature
+                in_stack = False
+        flush()
+    return table.summary()
+
+
+def parse_sanitizer_log(source):
+    """Parses AddressSanitizer/ThreadSanitizer/LeakSanitizer output (usually the binary's stderr), from a path or lines."""
+    table = ErrorTable("sanitizer")
+    kind = None
+    frames = []
+    leaked_bytes = 0
+    in_stack = False
+
+    def flush():
+        if kind is not None:
+            table.add(kind, frames, leaked_bytes)
+
+    with open_lines(source) as f:
+        for line in f:
+            text = line.rstrip('\n')
+            header = sanitizer_header.match(text)
+            leak = sanitizer_leak.match(text)
+            if header or leak:
+                flush()
+                frames, in_stack = [], True
+                if header:
+                    if table.tool == "sanitizer":
+                        table.tool = header.group(1)
+                    # "heap-buffer-overflow on address 0x..." -> "heap-buffer-overflow"
+                    kind = normalize_kind(header.group(2).split(" on ")[0])
+                    leaked_bytes = 0
+                    if kind == "detected memory leaks":
+                        kind = None
+                else:
+                    kind = f"{leak.group(1).lower()} leak"
+                    leaked_bytes = int(leak.group(2))
+                    table.add_leak(kind, leaked_bytes, int(leak.group(3)))
+                continue
+            frame = sanitizer_frame.match(text)
+            if frame and in_stack:
+                frames.append(frame.group(1))
+            elif not text.strip() and frames:
+                # Only the first stack (where it happened) is the signature
+                in_stack = False
+        flush()
+    return table.summary()
+
+
+def format_table(rows):
+    """Formats (label, summary) pairs as a compact table."""
+    lines = [f"{'run':<32} {'errors':>7} {'unique':>7} {'def. lost':>10}  top error"]
+    for label, summary in rows:
+        lost = summary["leaks"].get("definitely lost", summary["leaks"].get("direct leak", {})).get("bytes", 0)
+        top = summary["errors"][0]["kind"] if summary["errors"] else "-"
+        lines.append(f"{label:<32} {summary['error_count']:>7} {len(summary['errors']):>7} {lost:>10}  {top}")
+    return "\n".join(lines)
+
+
+# Profiles: callgrind and cachegrind output files, parsed into per-function costs
+#
+#   {"tool": ..., "events": ["Ir", "D1mr", ...], "totals": {event: count},
+#    "functions": {name: {"file": ..., "self": {event: count}, "inclusive": {event: count}}}}
+#
+# "inclusive" (the function and everything it calls) only comes from callgrind;
+# a recursive function counts its recursive calls again.
+
+# Groups of events compared between profiles, a group is skipped when a profile has none of its events
+PROFILE_METRICS = {"Ir": ("Ir",), "L1 misses": ("I1mr", "D1mr", "D1mw"), "LL misses": ("ILmr", "DLmr", "DLmw")}
+# A function only regresses when it grew by at least this share of the program's total,
+# small functions jitter by a few percent from run to run
+PROFILE_NOISE_SHARE = 0.005
+
+profile_name = re.compile(r'^\((\d+)\)(?: (.*))?$')
+
+
+def parse_profile(source, tool):
+    """Parses a callgrind.out or cachegrind.out file, from a path or lines, into per-function self costs."""
+    events = []
+    positions = 1
+    totals = None
+    functions = {}
+    names = {}
+    current_file = current = None
+    # Callgrind writes the inclusive cost of a call on the line after calls=
+    call_cost = False
+    skip_line = False
+
+    def decompress(kind, value):
+        # Callgrind names an object, file or function "(id) name" once, then only "(id)"
+        match = profile_name.match(value)
+        if not match:
+            return value
+        if match.group(2) is not None:
+            names[kind, match.group(1)] = match.group(2)
+        return names.get((kind, match.group(1)), value)
+
+    def costs(fields):
+        counts = [int(field) if field.isdigit() else 0 for field in fields[positions:]]
+        return dict(zip(events, counts + [0] * (len(events) - len(counts))))
+
+    def add(target, counts):
+        for event, count in counts.items():
+            target[event] = target.get(event, 0) + count
+
+    with open_lines(source) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            key, _, value = line.partition('=')
+            if line[0].isdigit() or line[0] in '+-*':
+                if skip_line:
+                    skip_line = False
+                    continue
+                if current is None:
+                    continue
+                entry = functions.setdefault(current, {"file": current_file, "self": {}, "inclusive": {}})
+                counts = costs(line.split())
+                if call_cost:
+                    call_cost = False
+                    if tool == "callgrind":
+                        add(entry["inclusive"], counts)
+                    continue
+                add(entry["self"], counts)
+                if tool == "callgrind":
+                    add(entry["inclusive"], counts)
+            elif line.startswith('events:'):
+                events = line.split()[1:]
+            elif line.startswith('positions:'):
+                positions = len(line.split()) - 1
+            elif line.startswith(('summary:', 'totals:')):
+                totals = dict(zip(events, (int(field) for field in line.split()[1:])))
+            elif key in ('fl', 'fi', 'fe'):
+                current_file = decompress('file', value)
+            elif key == 'fn':
+                current = decompress('fn', value)
+            elif key in ('cfl', 'cfi', 'cfn', 'ob', 'cob'):
+                # Only registers compressed names, the callee matters through the call's cost alone
+                decompress({'cfl': 'file', 'cfi': 'file', 'cfn': 'fn'}.get(key, 'ob'), value)
+            elif key == 'calls':
+                call_cost = True
+            elif key in ('jump', 'jcnd'):
+                skip_line = True
+
+    if totals is None:
+        totals = {}
+        for entry in functions.values():
+            add(totals, entry["self"])
+    return {"tool": tool, "events": events, "totals": totals, "functions": functions}
+
+
+def merge_profiles(profiles):
+    """Merges profiles of the same run (callgrind for the call graph, cachegrind for the cache misses).
+
+    An event already given by an earlier profile is not taken from a later one.
+    """
+    merged = {"tool": "+".join(profile["tool"] for profile in profiles), "events": [], "totals": {}, "functions": {}}
+    for profile in profiles:
+        fresh = [event for event in profile["events"] if event not in merged["events"]]
+        merged["events"] += fresh
+        for event in fresh:
+            merged["totals"][event] = profile["totals"].get(event, 0)
+        for name, entry in profile["functions"].items():
+            target = merged["functions"].setdefault(name, {"file": entry["file"], "self": {}, "inclusive": {}})
+            for part in ("self", "inclusive"):
+                for event in fresh:
+                    if event in entry[part]:
+                        target[part][event] = entry[part][event]
+    return merged
+
+
+def metric(costs, events):
+    return sum(costs.get(event, 0) for event in events)
+
+
+def hot_functions(profile, top):
+    """The top names by self instruction count (or the first event when Ir is missing)."""
+    event = "Ir" if "Ir" in profile["events"] else (profile["events"] or [None])[0]
+    ranked = sorted(profile["functions"].items(), key=lambda item: item[1]["self"].get(event, 0), reverse=True)
+    return [name for name, _ in ranked[:top]]
+
+
+def diff_profiles(current, baseline, top, threshold):
+    """Compares the totals and the hot functions of two profiles.
+
+    Returns [{"function", "metric", "old", "new", "change" (percent, None when new), "regression"}],
+    "function" is None for the program's totals. A change above threshold percent is
+    a regression; for a function it must also weigh PROFILE_NOISE_SHARE of the total.
+    """
+    rows = []
+    names = hot_functions(current, top)
+    names += [name for name in hot_functions(baseline, top) if name not in names]
+    for label, events in PROFILE_METRICS.items():
+        if not any(event in current["events"] for event in events) or \
+                not any(event in baseline["events"] for event in events):
+            continue
+        total = metric(current["totals"], events)
+        for name in [None] + names:
+            if name is None:
+                old, new = metric(baseline["totals"], events), total
+            else:
+                old = metric(baseline["functions"].get(name, {}).get("self", {}), events)
+                new = metric(current["functions"].get(name, {}).get("self", {}), events)
+            if not old and not new:
+                continue
+            change = (new - old) * 100 / old if old else None
+            grew = new > old and (change is None or change > threshold)
+            regression = grew and (name is None or new - old >= total * PROFILE_NOISE_SHARE)
+            rows.append({"function": name, "metric": label, "old": old, "new": new, "change": change,
+                         "regression": regression})
+    return rows
+
+
+def format_profile(profile, top):
+    """Formats the top hot functions of a profile as a table."""
+    total_ir = profile["totals"].get("Ir", 0)
+    lines = [f"{'Ir (self)':>14} {'%':>6} {'Ir (incl.)':>14} {'L1 misses':>11} {'LL misses':>11}  function"]
+    for name in hot_functions(profile, top):
+        entry = profile["functions"][name]
+        ir = entry["self"].get("Ir", 0)
+        share = f"{ir * 100 / total_ir:.1f}" if total_ir else "-"
+        inclusive = entry["inclusive"].get("Ir")
+        misses = [metric(entry["self"], PROFILE_METRICS[label]) if any(event in profile["events"] for event in
+                  PROFILE_METRICS[label]) else None for label in ("L1 misses", "LL misses")]
+        cells = [f"{value:>{width}}" if value is not None else f"{'-':>{width}}"
+                 for value, width in ((inclusive, 14), (misses[0], 11), (misses[1], 11))]
+        where = f" ({entry['file']})" if entry["file"] else ""
+        lines.append(f"{ir:>14} {share:>6} {' '.join(cells)}  {name}{where}")
+    return "\n".join(lines)
+
+
+def format_profile_diff(rows):
+    """Formats diff_profiles rows as a table, regressions marked with '!'."""
+    lines = [f"  {'metric':<10} {'baseline':>14} {'current':>14} {'change':>9}  function"]
+    for row in rows:
+        change = f"{row['change']:+.1f}%" if row["change"] is not None else "new"
+        mark = "!" if row["regression"] else " "
+        lines.append(f"{mark} {row['metric']:<10} {row['old']:>14} {row['new']:>14} {change:>9}  "
+                     f"{row['function'] if row['function'] is not None else '(total)'}")
+    return "\n".join(lines)
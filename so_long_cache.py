@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+import so_long_map_reader
+import so_long_map_validator
+
+# Remembers so_long_map_tester results between runs, in .tester_cache/so_long.json.
+# Validator verdicts are keyed by the map's SHA-256 (and thrown away when the
+# validator changes), so_long results by the SHA-256 of the binary and of the map,
+# so only new or edited maps, or every map after a rebuild, run again. so_long
+# results cached by an older tester are thrown away when SO_LONG_VERSION changes.
+
+CACHE_DIR = '.tester_cache'
+CACHE_FILE = os.path.join(CACHE_DIR, 'so_long.json')
+# 2: a so_long still running at the timeout is no longer cached as OK
+SO_LONG_VERSION = 2
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def validator_version():
+    """Hash of the validator's code, its verdicts are only reused while it is unchanged."""
+    return hashlib.sha256("".join(file_hash(module.__file__) for module in
+                                  (so_long_map_reader, so_long_map_validator)).encode()).hexdigest()
+
+
+def load_cache():
+    """Returns {"validator": {map hash: [valid, message]}, "so_long": {"binary:map": [ok, output]}}."""
+    try:
+        with open(CACHE_FILE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    validator = cache.get("validator", {}) if cache.get("validator_version") == validator_version() else {}
+    so_long = cache.get("so_long", {}) if cache.get("so_long_version") == SO_LONG_VERSION else {}
+    return {"validator": validator, "so_long": so_long}
+
+
+def save_cache(cache, binary_hash, map_hashes):
+    """Saves the cache, keeping only the entries of the current binary and maps so it does not grow forever."""
+    current = set(map_hashes)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(CACHE_FILE, 'w') as f:
+        json.dump({"validator_version": validator_version(), "so_long_version": SO_LONG_VERSION,
+                   "validator": {key: value for key, value in cache["validator"].items() if key in current},
+                   "so_long": {key: value for key, value in cache["so_long"].items()
+                               if key.split(':')[0] == binary_hash and key.split(':')[1] in current}}, f)
+
+
+def so_long_key(binary_hash, map_hash):
+    return f"{binary_hash}:{map_hash}"
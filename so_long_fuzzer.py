@@ -0,0 +1,279 @@
+import os
+import re
+import time
+import random
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import so_long_map_reader
+import so_long_map_generator
+import tester_executor
+from so_long_map_tester import (RED, YELLOW, SO_LONG_OK, SO_LONG_TIMEOUT, color_text, run_so_long,
+								start_displays, stop_displays)
+
+# Differential fuzzer: mutates maps and checks every mutant with both the Python
+# validator and ./so_long. There is no coverage information from so_long, so the
+# observed behaviour stands in for it: a mutant whose (validator verdict, so_long
+# verdict, so_long output) signature was never seen joins the corpus and gets
+# mutated further. Discrepancies are deduplicated by signature and written to
+# ./check, once per signature, in the same format as so_long_map_tester.
+
+CHECK_DIR = './check'
+WORK_DIR = './.fuzz_work'
+# Mutants evaluated per round, per worker
+BATCH_PER_JOB = 4
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 5
+
+
+def random_cell(rows, rng, interior=False):
+	candidates = [i for i, row in enumerate(rows) if len(row) > (2 if interior else 0)]
+	if interior:
+		candidates = [i for i in candidates if 0 < i < len(rows) - 1] or candidates
+	if not candidates:
+		return None
+	i = rng.choice(candidates)
+	low, high = (1, len(rows[i]) - 2) if interior and len(rows[i]) > 2 else (0, len(rows[i]) - 1)
+	return i, rng.randint(low, high)
+
+
+def set_cell(rows, position, cell):
+	if position is not None:
+		i, j = position
+		rows[i] = rows[i][:j] + cell + rows[i][j + 1:]
+
+
+def flip_cell(rows, rng):
+	set_cell(rows, random_cell(rows, rng, interior=True), rng.choice('01CPE'))
+
+
+def remove_item(rows, rng):
+	item = rng.choice('PEC')
+	positions = [(i, j) for i, row in enumerate(rows) for j, cell in enumerate(row) if cell == item]
+	if positions:
+		set_cell(rows, rng.choice(positions), '0')
+
+
+def duplicate_item(rows, rng):
+	set_cell(rows, random_cell(rows, rng, interior=True), rng.choice('PEC'))
+
+
+def break_wall(rows, rng):
+	if not rows:
+		return
+	i = rng.choice([0, len(rows) - 1, rng.randrange(len(rows))])
+	if rows[i]:
+		j = rng.choice([0, len(rows[i]) - 1]) if 0 < i < len(rows) - 1 else rng.randrange(len(rows[i]))
+		set_cell(rows, (i, j), rng.choice('0CPE'))
+
+
+def add_blank_line(rows, rng):
+	rows.insert(rng.choice([0, len(rows), rng.randint(0, len(rows))]), "")
+
+
+def trailing_whitespace(rows, rng):
+	if rows:
+		i = rng.randrange(len(rows))
+		rows[i] += rng.choice([" ", "\t", "  ", " \t"])
+
+
+def crlf(rows, rng):
+	# A '\r' kept at the end of the row, the file is written with '\n' line ends
+	if rows:
+		for i in (range(len(rows)) if rng.random() < 0.5 else [rng.randrange(len(rows))]):
+			rows[i] += "\r"
+
+
+def invalid_char(rows, rng):
+	set_cell(rows, random_cell(rows, rng), rng.choice('2Xp \t'))
+
+
+def change_row(rows, rng):
+	if len(rows) < 2:
+		return
+	i = rng.randrange(len(rows))
+	action = rng.choice(["delete", "duplicate", "shorten", "extend"])
+	if action == "delete":
+		del rows[i]
+	elif action == "duplicate":
+		rows.insert(i, rows[i])
+	elif action == "shorten":
+		rows[i] = rows[i][:-1]
+	else:
+		rows[i] += '1'
+
+
+MUTATIONS = [flip_cell, remove_item, duplicate_item, break_wall, add_blank_line, trailing_whitespace,
+			 crlf, invalid_char, change_row]
+
+
+def mutate(rows, rng):
+	"""Returns a copy of rows with 1 to 3 random mutations applied."""
+	rows = list(rows)
+	for _ in range(rng.randint(1, 3)):
+		rng.choice(MUTATIONS)(rows, rng)
+	return rows
+
+
+def map_text(rows):
+	return "".join(row + "\n" for row in rows)
+
+
+def normalize_output(output):
+	"""First line of so_long's output with numbers removed, the part that tells failures apart."""
+	lines = [line.strip() for line in output.splitlines() if line.strip()]
+	return re.sub(r'\d+', 'N', lines[0])[:80] if lines else ""
+
+
+def validator_kind(message):
+	"""The validator message without positions and sizes."""
+	return re.sub(r'\d+', 'N', message.split(" found at")[0].split(" at (")[0])
+
+
+def evaluate(path, timeout, displays):
+	"""Checks one written mutant with both sides, returns (validator ok, message, so_long ok, output).
+
+	so_long ok is None when so_long timed out, it neither accepted nor rejected the map.
+	"""
+	is_valid, message = so_long_map_reader.validate_map_file(path)
+	so_long_status, so_long_output = run_so_long(path, timeout, displays)
+	so_long_ok = None if so_long_status == SO_LONG_TIMEOUT else so_long_status == SO_LONG_OK
+	return is_valid, message, so_long_ok, so_long_output
+
+
+def signature(is_valid, message, so_long_ok, so_long_output):
+	return (is_valid, validator_kind(message), so_long_ok, normalize_output(so_long_output))
+
+
+def load_seeds(maps_dir, rng, count=16):
+	"""The maps of maps_dir, or freshly generated valid maps when there are none."""
+	seeds = []
+	if os.path.isdir(maps_dir):
+		for dirpath, _, filenames in os.walk(maps_dir):
+			for filename in sorted(filenames):
+				if filename.endswith('.ber'):
+					with open(os.path.join(dirpath, filename), newline='') as f:
+						rows = f.read().split('\n')
+					seeds.append(rows[:-1] if rows[-1] == "" else rows)
+	if not seeds:
+		for _ in range(count):
+			rows, _ = so_long_map_generator.generate_map(rng.randint(5, 20), rng.randint(4, 12), "valid", rng)
+			seeds.append(rows)
+	return seeds
+
+
+def record_discrepancy(path, is_valid, message, so_long_ok, so_long_output, key):
+	"""Saves a discrepancy to ./check like so_long_map_tester does, returns the file's path."""
+	os.makedirs(CHECK_DIR, exist_ok=True)
+	digest = hashlib.sha256(repr(key).encode()).hexdigest()[:10]
+	dest_path = os.path.join(CHECK_DIR, f"fuzz_{digest}.ber")
+	shutil.copy(path, dest_path)
+	with open(dest_path, 'a') as copied_file:
+		copied_file.write("\n\nValidator Output:\n")
+		copied_file.write(message if is_valid else f"Invalid map: {message}")
+		copied_file.write("\n\nso_long Output:\n")
+		copied_file.write(so_long_output)
+	return dest_path
+
+
+def fuzz(seeds, iterations, duration, jobs, timeout, displays, rng, log=print):
+	"""Runs the fuzzing loop, returns (checks done, {discrepancy signature: (check file, count)}).
+
+	Mutants so_long timed out on are counted as checks, nothing else is learnt from them.
+	"""
+	os.makedirs(WORK_DIR, exist_ok=True)
+	corpus = list(seeds)
+	seen = set()
+	discrepancies = {}
+	checks = 0
+	start = time.time()
+	last_report = 0
+	batch_size = max(1, jobs) * BATCH_PER_JOB
+	with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+		while checks < iterations and time.time() - start < duration:
+			mutants = [mutate(rng.choice(corpus), rng) for _ in range(min(batch_size, iterations - checks))]
+			paths = []
+			for slot, rows in enumerate(mutants):
+				path = os.path.join(WORK_DIR, f"mutant_{slot}.ber")
+				with open(path, 'w', newline='') as f:
+					f.write(map_text(rows))
+				paths.append(path)
+			results = executor.map(lambda path: evaluate(path, timeout, displays), paths)
+			for path, rows, result in zip(paths, mutants, results):
+				checks += 1
+				if result[2] is None:
+					continue
+				key = signature(*result)
+				if key not in seen:
+					# New behaviour: keep the mutant, its neighbours are likely to find more
+					seen.add(key)
+					corpus.append(rows)
+				is_valid, message, so_long_ok, so_long_output = result
+				if is_valid == so_long_ok:
+					continue
+				if key in discrepancies:
+					check_path, count = discrepancies[key]
+					discrepancies[key] = (check_path, count + 1)
+					continue
+				check_path = record_discrepancy(path, *result, key)
+				discrepancies[key] = (check_path, 1)
+				log(color_text(f" - New discrepancy {check_path} - Validator: {'OK' if is_valid else 'Error'} "
+							   f"({message}), ./so_long: {'OK' if so_long_ok else 'Error'}", YELLOW))
+			elapsed = time.time() - start
+			if elapsed - last_report >= PROGRESS_INTERVAL or checks >= iterations:
+				last_report = elapsed
+				log(f"{checks} checks, {checks / elapsed * 60:.0f}/min, corpus {len(corpus)}, "
+					f"{len(seen)} behaviours, {len(discrepancies)} discrepancies")
+	shutil.rmtree(WORK_DIR, ignore_errors=True)
+	return checks, discrepancies
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Differential fuzzing of the map validator against ./so_long.")
+	parser.add_argument("--maps", default="./maps", help="directory of seed maps (default: ./maps, generated maps if empty)")
+	parser.add_argument("--iterations", type=int, default=10000, help="number of mutants to check (default: 10000)")
+	parser.add_argument("--duration", type=float, default=float('inf'), help="stop after this many seconds")
+	parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+						help="number of so_long instances running at the same time (default: CPU count)")
+	parser.add_argument("--timeout", type=float, default=5.0,
+						help="seconds so_long has to fail or show its window, after that the mutant is skipped (default: 5)")
+	parser.add_argument("--display", help="X display to use instead of starting Xvfb")
+	parser.add_argument("--seed", type=int, help="seed of the mutations (default: a fresh one)")
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	# A second slot per so_long for the xdotool looking for its window
+	tester_executor.configure(2 * args.jobs)
+	if not os.path.exists('./so_long'):
+		print(color_text("No so_long found, maybe you forgot to make?", RED))
+		exit(1)
+	seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+	print(f"Seed: {seed}")
+	rng = random.Random(seed)
+
+	display_processes, displays = start_displays(max(1, args.jobs), args.display)
+	if shutil.which('xdotool') is None:
+		print(color_text("xdotool not found: no window can be confirmed, valid maps time out and are skipped", YELLOW))
+	if not display_processes and args.display is None:
+		display = os.environ.get('DISPLAY')
+		print(color_text("Xvfb not found, so_long windows open on " + display if display else
+						 "Xvfb not found and no DISPLAY: valid maps can not open a window and will fail", YELLOW))
+	try:
+		checks, discrepancies = fuzz(load_seeds(args.maps, rng), args.iterations, args.duration, args.jobs,
+									 args.timeout, displays, rng)
+	finally:
+		stop_displays(display_processes)
+
+	print("-" * 100)
+	print(f"\nTotal checks: {checks}")
+	print(f"Unique discrepancies: {len(discrepancies)}\n")
+	for (is_valid, kind, so_long_ok, output), (check_path, count) in sorted(discrepancies.items(), key=lambda item: -item[1][1]):
+		print(f"{count:>6}x  {check_path}  validator: {'OK' if is_valid else 'Error'} ({kind})  "
+			  f"so_long: {'OK' if so_long_ok else 'Error'} ({output})")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,30 +1,84 @@
 import random
 import os
+import time
+import argparse
+import tempfile
+import so_long_map_validator
+import tester_executor
 from collections import deque
 
 # 1. Generate Random Map
-def generate_random_map(width, height):
+def generate_random_map(width, height, rng=random):
     map_data = [['1' for _ in range(width)] for _ in range(height)]
     for i in range(1, height-1):
-        for j in range(1, width-1):
-            map_data[i][j] = random.choice(['0', '1', 'C'])
+        # One batched draw per row instead of a random.choice per cell
+        map_data[i][1:width-1] = rng.choices(['0', '1', 'C'], k=width-2)
     
-    start_i, start_j = random.randint(1, height-2), random.randint(1, width-2)
+    start_i, start_j = rng.randint(1, height-2), rng.randint(1, width-2)
     map_data[start_i][start_j] = 'P'
     
-    exit_i, exit_j = random.randint(1, height-2), random.randint(1, width-2)
+    exit_i, exit_j = rng.randint(1, height-2), rng.randint(1, width-2)
     while (exit_i, exit_j) == (start_i, start_j):
-        exit_i, exit_j = random.randint(1, height-2), random.randint(1, width-2)
+        exit_i, exit_j = rng.randint(1, height-2), rng.randint(1, width-2)
     map_data[exit_i][exit_j] = 'E'
     
-    collect_i, collect_j = random.randint(1, height-2), random.randint(1, width-2)
+    collect_i, collect_j = rng.randint(1, height-2), rng.randint(1, width-2)
     while (collect_i, collect_j) in [(start_i, start_j), (exit_i, exit_j)]:
-        collect_i, collect_j = random.randint(1, height-2), random.randint(1, width-2)
+        collect_i, collect_j = rng.randint(1, height-2), rng.randint(1, width-2)
     map_data[collect_i][collect_j] = 'C'
 
     return [''.join(row) for row in map_data]
 
 
+def carve_path(map_data, start, end):
+    """Opens an L-shaped path from start to end, walls on it become floor."""
+    (i, j), (end_i, end_j) = start, end
+    while (i, j) != (end_i, end_j):
+        if j != end_j:
+            j += 1 if end_j > j else -1
+        else:
+            i += 1 if end_i > i else -1
+        if map_data[i][j] == '1':
+            map_data[i][j] = '0'
+
+
+def wall_off_unreachable(map_data, start):
+    """Turns every cell the player cannot reach into a wall."""
+    if so_long_map_validator.np is not None:
+        grid = so_long_map_validator.load_map([''.join(row) for row in map_data])
+        reached = so_long_map_validator.reachable(grid != so_long_map_validator.WALL, start)
+        for i, j in zip(*so_long_map_validator.np.nonzero(~reached)):
+            map_data[i][j] = '1'
+        return
+    visited = flood_fill(map_data, start)
+    for i, row in enumerate(map_data):
+        for j in range(len(row)):
+            if (i, j) not in visited:
+                row[j] = '1'
+
+
+def generate_valid_map(width, height, rng, wall_ratio=0.3, collectible_ratio=0.02):
+    """Generates a valid map as a list of rows (lists of cells).
+
+    P, E and one C are joined by carved paths, the rest is random, and pockets
+    the player cannot reach are walled in.
+    """
+    floor_ratio = max(0.0, 1 - wall_ratio - collectible_ratio)
+    map_data = [['1'] * width]
+    for _ in range(height - 2):
+        map_data.append(['1'] + rng.choices('01C', weights=(floor_ratio, wall_ratio, collectible_ratio), k=width - 2) + ['1'])
+    map_data.append(['1'] * width)
+    interior = width - 2
+    start, exit, collectible = (divmod(cell, interior) for cell in rng.sample(range(interior * (height - 2)), 3))
+    start, exit, collectible = ((i + 1, j + 1) for i, j in (start, exit, collectible))
+    for (i, j), cell in ((start, 'P'), (exit, 'E'), (collectible, 'C')):
+        map_data[i][j] = cell
+    carve_path(map_data, start, exit)
+    carve_path(map_data, start, collectible)
+    wall_off_unreachable(map_data, start)
+    return map_data
+
+
 # 2. Validate Map
 def flood_fill(map_data, start):
     visited = set()
@@ -64,16 +118,201 @@ def validate_map(map_data):
             return False, f"No path to {map_data[pos[0]][pos[1]]} at ({pos[0]}, {pos[1]})"
     return True, "Map is valid."
 
+def cells_of(map_data, kinds):
+    return [(i, j) for i, row in enumerate(map_data) for j, cell in enumerate(row) if cell in kinds]
+
+
+# Random cells looked at when searching for a walled in one
+ISOLATED_PROBES = 256
+
+
+def isolated_cell(map_data, rng):
+    """Returns an interior wall whose 4 neighbours are walls, creating one if none is found."""
+    height, width = len(map_data), len(map_data[0])
+    # Random probes instead of a scan, huge maps would spend seconds looking at every cell
+    for _ in range(ISOLATED_PROBES):
+        i, j = rng.randint(1, height - 2), rng.randint(1, width - 2)
+        if all(map_data[x][y] == '1' for x, y in ((i, j), (i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1))):
+            return i, j
+    # Wall in a random floor cell, this can cut more of the map off, generate_map checks the result
+    i, j = rng.choice(cells_of(map_data, '0'))
+    for x, y in ((i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)):
+        if 0 < x < height - 1 and 0 < y < width - 1 and map_data[x][y] == '0':
+            map_data[x][y] = '1'
+    return i, j
+
+
+def open_wall(map_data, rng):
+    height, width = len(map_data), len(map_data[0])
+    border = [(0, j) for j in range(width)] + [(height - 1, j) for j in range(width)] + \
+             [(i, 0) for i in range(1, height - 1)] + [(i, width - 1) for i in range(1, height - 1)]
+    i, j = rng.choice(border)
+    map_data[i][j] = '0'
+
+
+def duplicate(cell):
+    def inject(map_data, rng):
+        i, j = rng.choice(cells_of(map_data, '0C'))
+        map_data[i][j] = cell
+    return inject
+
+
+def remove(kind):
+    def inject(map_data, rng):
+        for i, j in cells_of(map_data, kind):
+            map_data[i][j] = '0'
+    return inject
+
+
+def unreachable(cell):
+    def inject(map_data, rng):
+        if cell == 'E':
+            for i, j in cells_of(map_data, 'E'):
+                map_data[i][j] = '0'
+        i, j = isolated_cell(map_data, rng)
+        map_data[i][j] = cell
+    return inject
+
+
+def invalid_char(map_data, rng):
+    i, j = rng.choice(cells_of(map_data, '01C'))
+    if i in (0, len(map_data) - 1) or j in (0, len(map_data[0]) - 1):
+        i, j = rng.randint(1, len(map_data) - 2), rng.randint(1, len(map_data[0]) - 2)
+    map_data[i][j] = rng.choice('2XpeA ')
+
+
+def not_rectangular(map_data, rng):
+    row = map_data[rng.randint(1, len(map_data) - 2)]
+    if rng.random() < 0.5:
+        row.insert(-1, '1')
+    else:
+        del row[-2]
+
+
+# Failure categories: how to break a valid map, and the start of the message is_valid_map gives for it
+CATEGORIES = {
+    "open_wall": (open_wall, "Map is not surrounded by walls"),
+    "duplicate_player": (duplicate('P'), "More than one player"),
+    "duplicate_exit": (duplicate('E'), "More than one exit"),
+    "missing_player": (remove('P'), "Map missing player's starting position"),
+    "missing_exit": (remove('E'), "Map missing exit"),
+    "missing_collectible": (remove('C'), "Map missing collectibles"),
+    "unreachable_exit": (unreachable('E'), "No path from start to exit"),
+    "unreachable_collectible": (unreachable('C'), "No path from start to collectible"),
+    "invalid_char": (invalid_char, "Invalid cell"),
+    "not_rectangular": (not_rectangular, "Map is not rectangular"),
+}
+# Attempts at breaking a map the way its category asks before falling back to a valid map
+MAX_ATTEMPTS = 20
+
+
+def generate_map(width, height, category, rng, wall_ratio=0.3, collectible_ratio=0.02):
+    """Generates the rows of one map of the given category ("valid" or a CATEGORIES key).
+
+    Returns (rows, category), the category is "valid" when the map was too small
+    to break that way.
+    """
+    map_data = generate_valid_map(width, height, rng, wall_ratio, collectible_ratio)
+    if category == "valid":
+        return [''.join(row) for row in map_data], category
+    inject, expected = CATEGORIES[category]
+    for _ in range(MAX_ATTEMPTS):
+        broken = [row[:] for row in map_data]
+        try:
+            inject(broken, rng)
+        except IndexError:
+            # rng.choice on an empty list, the map has no cell to break that way
+            continue
+        rows = [''.join(row) for row in broken]
+        if so_long_map_validator.is_valid_map(rows)[1].startswith(expected):
+            return rows, category
+    return [''.join(row) for row in map_data], "valid"
+
+
+def parse_size(value):
+    width, height = (int(part) for part in value.lower().split('x'))
+    if width < 3 or height < 3 or (width - 2) * (height - 2) < 3:
+        raise argparse.ArgumentTypeError(f"{value}: a map needs room for P, E and C inside its walls")
+    return width, height
+
+
+def parse_ratio(value):
+    category, weight = value.split(':')
+    if category not in CATEGORIES:
+        raise argparse.ArgumentTypeError(f"unknown category '{category}', one of: {', '.join(CATEGORIES)}")
+    return category, float(weight)
+
+
+def category_weights(valid_ratio, ratios):
+    """Returns (categories, weights): valid maps get valid_ratio, the rest is shared by the failure categories.
+
+    Without --ratio every failure category gets the same share.
+    """
+    failures = dict(ratios) if ratios else {category: 1.0 for category in CATEGORIES}
+    total = sum(failures.values())
+    categories = ["valid"] + list(failures)
+    weights = [valid_ratio] + [(1 - valid_ratio) * weight / total for weight in failures.values()]
+    return categories, weights
+
+
+def generate_maps(count, sizes, out_dir, seed, valid_ratio=0.5, ratios=(), wall_ratio=0.3, collectible_ratio=0.02):
+    """Streams count maps into out_dir, each written as soon as it is generated.
+
+    Map i only depends on seed and i, so any map can be regenerated on its own.
+    Returns {category: number of maps}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    categories, weights = category_weights(valid_ratio, ratios)
+    digits = len(str(count - 1))
+    counts = {}
+    for index in range(count):
+        rng = random.Random(f"{seed}:map:{index}")
+        width, height = rng.choice(sizes)
+        wanted = rng.choices(categories, weights=weights)[0]
+        rows, category = generate_map(width, height, wanted, rng, wall_ratio, collectible_ratio)
+        counts[category] = counts.get(category, 0) + 1
+        with open(os.path.join(out_dir, f"{index:0{digits}d}_{category}.ber"), 'w') as f:
+            f.write('\n'.join(rows) + '\n')
+    return counts
+
+
 # 3. Execute so_long and Check
 def execute_so_long(map_data):
-    with open("temp.ber", "w") as f:
+    # A file of its own, several generators can run in the same directory
+    with tempfile.NamedTemporaryFile('w', suffix='.ber', dir='.', delete=False) as f:
         for row in map_data:
             f.write(row + "\n")
-    result = os.system('./so_long temp.ber')
-    os.remove('temp.ber')
-    return result
+    try:
+        return tester_executor.run(['./so_long', f.name], stdout=None, stderr=None).returncode
+    finally:
+        os.remove(f.name)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generates so_long maps. Without --count, generates one 10x10 map and runs ./so_long on it.")
+    parser.add_argument("--count", type=int, help="number of maps to write into --out")
+    parser.add_argument("--out", default="maps", help="directory the maps are written to (default: maps)")
+    parser.add_argument("--sizes", type=lambda value: [parse_size(size) for size in value.split(',')], default=[(10, 10)],
+                        metavar="WxH[,WxH...]", help="map sizes, each map picks one at random (default: 10x10)")
+    parser.add_argument("--seed", type=int, default=0, help="seed every map derives from (default: 0)")
+    parser.add_argument("--valid-ratio", type=float, default=0.5, help="share of valid maps (default: 0.5)")
+    parser.add_argument("--ratio", type=parse_ratio, action="append", default=[], metavar="CATEGORY:WEIGHT",
+                        help="relative weight of a failure category among the invalid maps, can be repeated; "
+                             f"categories missing from the list are not generated (default: all equal, categories: {', '.join(CATEGORIES)})")
+    parser.add_argument("--wall-ratio", type=float, default=0.3, help="share of walls inside the maps (default: 0.3)")
+    parser.add_argument("--collectible-ratio", type=float, default=0.02, help="share of collectibles inside the maps (default: 0.02)")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.count is not None:
+        start = time.time()
+        counts = generate_maps(args.count, args.sizes, args.out, args.seed, args.valid_ratio, args.ratio,
+                               args.wall_ratio, args.collectible_ratio)
+        print(f"Generated {args.count} maps in {args.out} in {time.time() - start:.1f}s (seed {args.seed})")
+        for category, number in sorted(counts.items()):
+            print(f"  {category:<24} {number}")
+        return
+
     map_data = generate_random_map(10, 10)
     print("\nGenerated Map:")
     for row in map_data:
@@ -0,0 +1,167 @@
+import re
+from collections import namedtuple
+import so_long_map_validator
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# Streaming .ber reader. The file is read in binary, one row (or CHUNK_SIZE
+# bytes of a huge row) at a time, and the row lengths, the charset, the walls,
+# the P/E/C counts, empty lines and line endings are checked on the fly, exactly
+# as the bytes are in the file: nothing is stripped, so a trailing space, a CRLF
+# or a blank last line is an error. The first problem ends the read, and only
+# the current piece of a row is ever held, whatever the size of the map.
+# Reachability needs the whole map: once everything else passed, the file is
+# loaded as one uint8 array (one byte per cell) for the flood fill.
+
+CHUNK_SIZE = 1024 * 1024
+
+MapInfo = namedtuple('MapInfo', ['width', 'height', 'player', 'exit', 'collectibles'])
+
+invalid_cell = re.compile(rb'[^01CPE]')
+not_wall = re.compile(rb'[^1]')
+
+
+def cell_text(byte):
+	cell = chr(byte)
+	return f"'{cell}'" if cell.isprintable() else repr(cell)
+
+
+def first_error(content, row, col, width, players, exits):
+	"""Returns (offset in content, message) of the first problem in a piece of a row, or None."""
+	errors = []
+	invalid = invalid_cell.search(content)
+	if invalid:
+		offset = invalid.start()
+		errors.append((offset, f"Invalid cell {cell_text(content[offset])} found at position ({row}, {col + offset})"))
+	# Only the first row can be checked for walls as it is read, the last one is only known at the end
+	wall = not_wall.search(content) if row == 0 else (re.match(rb'[^1]', content) if col == 0 else None)
+	if wall:
+		errors.append((wall.start(), "Map is not surrounded by walls"))
+	for cell, seen, message in ((b'P', players, "More than one player ('P')"), (b'E', exits, "More than one exit ('E')")):
+		first = content.find(cell)
+		second = content.find(cell, first + 1) if first != -1 else -1
+		if seen and first != -1:
+			errors.append((first, message))
+		elif second != -1:
+			errors.append((second, message))
+	if width is not None and col + len(content) > width:
+		errors.append((width - col, f"Map is not rectangular. Row {row} is longer than {width}"))
+	return min(errors) if errors else None
+
+
+def scan_map(path, chunk_size=CHUNK_SIZE):
+	"""Checks everything but reachability while streaming the file.
+
+	Returns (error message, None) at the first problem, or (None, MapInfo).
+	"""
+	width = None
+	row = 0
+	col = 0
+	row_walls = True
+	last_row_walls = True
+	last_byte = None
+	leading_empty = 0
+	trailing_empty = 0
+	player = exit = None
+	collectibles = 0
+	carry = b''
+	with open(path, 'rb') as f:
+		while True:
+			data = f.readline(chunk_size)
+			at_end = not data.endswith(b'\n') and len(data) < chunk_size
+			piece = carry + data
+			carry = b''
+			if not piece and col == 0:
+				break
+			ends_row = piece.endswith(b'\n')
+			content = piece[:-1] if ends_row else piece
+			crlf = ends_row and content.endswith(b'\r')
+			if crlf:
+				content = content[:-1]
+			elif content.endswith(b'\r') and not at_end:
+				# The '\r' of a '\r\n' cut in two by the chunk size, keep it for the next read
+				carry, content = b'\r', content[:-1]
+
+			if col == 0 and ends_row and not content:
+				# An empty line, where it is tells which error it is
+				if row == 0:
+					leading_empty += 1
+				else:
+					trailing_empty += 1
+				continue
+			if col == 0 and content:
+				if leading_empty:
+					return f"Map has {leading_empty} empty line(s) at the beginning", None
+				if trailing_empty:
+					return "Map has empty line(s) in the middle", None
+
+			error = first_error(content, row, col, width, player is not None, exit is not None)
+			if error:
+				return error[1], None
+			if player is None and b'P' in content:
+				player = (row, col + content.index(b'P'))
+			if exit is None and b'E' in content:
+				exit = (row, col + content.index(b'E'))
+			collectibles += content.count(b'C')
+			row_walls = row_walls and not_wall.search(content) is None
+			if content:
+				last_byte = content[-1]
+			col += len(content)
+
+			if (ends_row or at_end) and not carry:
+				if width is None:
+					width = col
+				elif col != width:
+					return f"Map is not rectangular. Row {row} has length {col}, expected {width}", None
+				if last_byte != ord('1'):
+					return "Map is not surrounded by walls", None
+				if crlf:
+					return f"Row {row} ends with a CRLF line ending ('\\r\\n')", None
+				last_row_walls = row_walls
+				row += 1
+				col = 0
+				row_walls = True
+
+	if row == 0:
+		return "Map is empty", None
+	if trailing_empty:
+		return "Empty line at the end of the map", None
+	if not last_row_walls:
+		return "Map is not surrounded by walls", None
+	if player is None:
+		return "Map missing player's starting position", None
+	if exit is None:
+		return "Map missing exit", None
+	if not collectibles:
+		return "Map missing collectibles", None
+	return None, MapInfo(width, row, player, exit, collectibles)
+
+
+def load_grid(path, info):
+	"""Loads a map that passed scan_map as a (height, width) uint8 array, one byte per cell."""
+	data = np.fromfile(path, dtype=np.uint8)
+	if data.size == info.height * (info.width + 1) - 1:
+		# The last row has no newline
+		data = np.append(data, np.uint8(ord('\n')))
+	return data.reshape(info.height, info.width + 1)[:, :info.width]
+
+
+def validate_map_file(path):
+	"""Validates a .ber file byte for byte, returns (is_valid, message) like is_valid_map."""
+	error, info = scan_map(path)
+	if error:
+		return False, error
+	if np is None:
+		with open(path, newline='') as f:
+			return so_long_map_validator.is_valid_map(f.read().splitlines())
+	grid = load_grid(path, info)
+	visited = so_long_map_validator.reachable(grid != so_long_map_validator.WALL, info.player)
+	if not visited[info.exit]:
+		return False, "No path from start to exit"
+	unreached = np.flatnonzero((grid == ord('C')) & ~visited)
+	if unreached.size:
+		return False, f"No path from start to collectible at {so_long_map_validator.position(grid, unreached[0])}"
+	return True, "Valid map"
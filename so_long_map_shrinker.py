@@ -0,0 +1,187 @@
+import os
+import time
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import tester_executor
+from so_long_map_tester import RED, GREEN, YELLOW, color_text, start_displays, stop_displays
+from so_long_fuzzer import evaluate, signature, map_text
+
+# Shrinks the maps of ./check (validator/so_long disagreements) to a small map
+# with the same disagreement: rows and columns are cropped, then cells replaced
+# by '1' or '0', delta debugging style, as long as the validator verdict, the
+# so_long verdict and so_long's output keep the same signature. The candidates
+# of a step are evaluated as one parallel batch. The result is written next to
+# the original as <name>.min.ber.
+
+CHECK_DIR = './check'
+WORK_DIR = './.shrink_work'
+MIN_SUFFIX = '.min.ber'
+# so_long_map_tester appends the outputs to the copied map after this
+OUTPUT_MARKER = "\n\nValidator Output:\n"
+
+
+def read_check_file(path):
+	"""Returns the rows of the map saved in a ./check file, without the appended outputs."""
+	with open(path, newline='') as f:
+		text = f.read().split(OUTPUT_MARKER)[0]
+	rows = text.split('\n')
+	return rows[:-1] if rows[-1] == "" else rows
+
+
+def write_map(path, rows, result=None):
+	"""Writes rows as a map, followed by the outputs like a ./check file when result is given."""
+	with open(path, 'w', newline='') as f:
+		f.write(map_text(rows))
+		if result is not None:
+			is_valid, message, _, so_long_output = result
+			f.write(OUTPUT_MARKER)
+			f.write(message if is_valid else f"Invalid map: {message}")
+			f.write("\n\nso_long Output:\n")
+			f.write(so_long_output)
+
+
+def remove_rows(rows, chunk):
+	chunk = set(chunk)
+	return [row for i, row in enumerate(rows) if i not in chunk]
+
+
+def remove_columns(rows, chunk):
+	chunk = set(chunk)
+	return [''.join(cell for j, cell in enumerate(row) if j not in chunk) for row in rows]
+
+
+def replace_cells(cell):
+	def apply(rows, chunk):
+		rows = [list(row) for row in rows]
+		for i, j in chunk:
+			rows[i][j] = cell
+		return [''.join(row) for row in rows]
+	return apply
+
+
+def cells_except(kinds):
+	return lambda rows: [(i, j) for i, row in enumerate(rows) for j, cell in enumerate(row) if cell not in kinds]
+
+
+# (what is removed or replaced, units of the current map, how a chunk of units is applied), tried in this order
+PHASES = [
+	("rows", lambda rows: list(range(len(rows))), remove_rows),
+	("columns", lambda rows: list(range(max(map(len, rows), default=0))), remove_columns),
+	("cells to '1'", cells_except('1'), replace_cells('1')),
+	("cells to '0'", cells_except('01'), replace_cells('0')),
+]
+
+
+def ddmin(current, units, apply, first_reproducing):
+	"""Delta debugging: removes ever smaller chunks of units from current while the failure reproduces."""
+	granularity = 2
+	while True:
+		items = units(current)
+		if not items:
+			return current
+		chunk = -(-len(items) // granularity)
+		candidates = [apply(current, items[start:start + chunk]) for start in range(0, len(items), chunk)]
+		smaller = first_reproducing(candidates)
+		if smaller is not None:
+			current = smaller
+			granularity = max(granularity - 1, 2)
+			continue
+		if granularity >= len(items):
+			return current
+		granularity = min(len(items), granularity * 2)
+
+
+def shrink_map(rows, target, executor, timeout, displays):
+	"""Shrinks rows while evaluating to the target signature, returns (smallest rows, maps evaluated)."""
+	tried = {}
+
+	def first_reproducing(candidates):
+		fresh = list({tuple(candidate): candidate for candidate in candidates if tuple(candidate) not in tried}.values())
+		paths = [os.path.join(WORK_DIR, f"candidate_{slot}.ber") for slot in range(len(fresh))]
+		for path, candidate in zip(paths, fresh):
+			write_map(path, candidate)
+		for candidate, result in zip(fresh, executor.map(lambda path: evaluate(path, timeout, displays), paths)):
+			tried[tuple(candidate)] = signature(*result) == target
+		for candidate in candidates:
+			if tried[tuple(candidate)]:
+				return candidate
+		return None
+
+	os.makedirs(WORK_DIR, exist_ok=True)
+	current = list(rows)
+	# Cropping can enable more replacements and the other way round, repeat until nothing changes
+	while True:
+		before = current
+		for _, units, apply in PHASES:
+			current = ddmin(current, units, apply, first_reproducing)
+		if current == before:
+			return current, len(tried)
+
+
+def shrink_files(paths, jobs, timeout, displays, log=print):
+	"""Shrinks every ./check file in paths, returns the paths of the minimal maps written."""
+	written = []
+	with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+		for path in paths:
+			start = time.time()
+			rows = read_check_file(path)
+			os.makedirs(WORK_DIR, exist_ok=True)
+			original = os.path.join(WORK_DIR, "original.ber")
+			write_map(original, rows)
+			result = evaluate(original, timeout, displays)
+			is_valid, message, so_long_ok, _ = result
+			if so_long_ok is None:
+				log(color_text(f" - {path}: so_long timed out, skipped", YELLOW))
+				continue
+			if is_valid == so_long_ok:
+				log(color_text(f" - {path}: validator and so_long agree now, skipped", GREEN))
+				continue
+			shrunk, evaluated = shrink_map(rows, signature(*result), executor, timeout, displays)
+			write_map(os.path.join(WORK_DIR, "shrunk.ber"), shrunk)
+			min_path = path[:-len('.ber')] + MIN_SUFFIX
+			write_map(min_path, shrunk, evaluate(os.path.join(WORK_DIR, "shrunk.ber"), timeout, displays))
+			written.append(min_path)
+			log(color_text(f" - {path}: {len(rows)}x{max(map(len, rows), default=0)} -> "
+						   f"{len(shrunk)}x{max(map(len, shrunk), default=0)} in {time.time() - start:.1f}s "
+						   f"({evaluated} maps) -> {min_path}", YELLOW))
+	shutil.rmtree(WORK_DIR, ignore_errors=True)
+	return written
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Shrinks the validator/so_long discrepancy maps of ./check.")
+	parser.add_argument("maps", nargs="*", help=f"./check files to shrink (default: every .ber in ./check but the {MIN_SUFFIX} ones)")
+	parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+						help="number of so_long instances running at the same time (default: CPU count)")
+	parser.add_argument("--timeout", type=float, default=5.0,
+						help="seconds so_long has to fail or show its window, a candidate it times out on does not "
+							 "reproduce (default: 5)")
+	parser.add_argument("--display", help="X display to use instead of starting Xvfb")
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	# A second slot per so_long for the xdotool looking for its window
+	tester_executor.configure(2 * args.jobs)
+	if not os.path.exists('./so_long'):
+		print(color_text("No so_long found, maybe you forgot to make?", RED))
+		exit(1)
+	paths = args.maps
+	if not paths and os.path.isdir(CHECK_DIR):
+		paths = sorted(os.path.join(CHECK_DIR, filename) for filename in os.listdir(CHECK_DIR)
+					   if filename.endswith('.ber') and not filename.endswith(MIN_SUFFIX))
+	if not paths:
+		print(color_text("No maps to shrink in ./check", GREEN))
+		return
+
+	display_processes, displays = start_displays(max(1, args.jobs), args.display)
+	try:
+		shrink_files(paths, args.jobs, args.timeout, displays)
+	finally:
+		stop_displays(display_processes)
+
+
+if __name__ == "__main__":
+	main()
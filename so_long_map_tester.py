@@ -1,12 +1,27 @@
 import os
+import time
+import queue
+import argparse
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+import so_long_map_reader
+import so_long_cache
+import tester_executor
 
 RED = '\033[91m'
 GREEN = '\033[92m'
 YELLOW = '\033[93m'
 RESET = '\033[0m'
 
+# so_long verdicts of batch mode. TIMEOUT: still running after --timeout without
+# a window found, it neither failed nor is known to accept the map
+SO_LONG_OK = GREEN + "OK" + RESET
+SO_LONG_ERROR = RED + "Error" + RESET
+SO_LONG_TIMEOUT = YELLOW + "Timeout" + RESET
+# Seconds between two looks for so_long's window
+WINDOW_POLL_INTERVAL = 0.05
+
 def clear_terminal():
 	if os.name == 'posix':  # For Unix/Linux/Mac
 		os.system('clear')
@@ -101,78 +116,224 @@ def is_valid_map(map_content):
 
 	return True, "Valid map"
 
-print("This script tests the compiled ./so_long binary.")
-print("Make sure to compile the ./so_long binary before running this script.")
-print("It tests against all maps under the directory /maps.\n")
-print("When your so_long opened the game, press 'ESC' to close it and continue with the next map.\n")
-# Wait for user to press Enter
-# Check if maps directory exists
-if not os.path.exists('./maps'):
-    print(color_text("No maps folder found", RED))
-    exit()  # terminate the script
-
-# Check if there are any .ber files in the maps directory
-if not any(fname.endswith('.ber') for fname in os.listdir('./maps')):
-    print(color_text("No maps in folder", RED))
-    exit()  # terminate the script
-
-# Check if so_long file exists
-if not os.path.exists('./so_long'):
-    print(color_text("No so_long found, maybe you forgot to make?", RED))
-    exit()  # terminate the script
-	
-input("Press Enter to continue...")
-
-clear_terminal()
-
-root_dir = './maps'
-discrepancies = []
-ok_files = []
-ok_results = []
-discrepancy_results = []
-
-check_dir = './check'
-os.makedirs(check_dir, exist_ok=True)
-
-if os.path.exists(check_dir):
-    for filename in os.listdir(check_dir):
-        if filename.endswith(".ber"):
-            file_path = os.path.join(check_dir, filename)
-            try:
-                os.remove(file_path)
-                print(f"Removed: {file_path}")
-            except OSError as e:
-                print(f"Error removing {file_path}: {e}")
-else:
-    print(f"Directory {check_dir} does not exist.")
-
-for dirpath, dirnames, filenames in os.walk(root_dir):
-	for file in filenames:
-		if file.endswith('.ber'):
-			file_path = os.path.join(dirpath, file)
-			
-			# Validate using our custom function
-			with open(file_path, 'r') as f:
-				content = [line.strip() for line in f.readlines()]
-				is_valid, message = is_valid_map(content)
-				if is_valid:
-					validator_status = GREEN + "OK" + RESET
+def start_virtual_display():
+	"""Starts Xvfb on a free display, returns (process, display) or (None, None) if it can not run."""
+	if shutil.which('Xvfb') is None:
+		return None, None
+	read_fd, write_fd = os.pipe()
+	# Xvfb picks a free display number itself and writes it to -displayfd once it accepts clients
+	process = subprocess.Popen(['Xvfb', '-displayfd', str(write_fd), '-screen', '0', '1920x1080x24', '-nolisten', 'tcp'],
+							   pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	os.close(write_fd)
+	with os.fdopen(read_fd) as f:
+		number = f.readline().strip()
+	if not number:
+		process.wait()
+		return None, None
+	return process, f":{number}"
+
+def start_displays(count, display=None):
+	"""Returns (Xvfb processes, queue of the environments so_long runs with, one per display).
+
+	A display runs one so_long at a time, so the window that shows on it is
+	that so_long's. Every worker gets an Xvfb of its own when Xvfb runs and no
+	display is given; else display, or DISPLAY, is the only one and so_long
+	runs one map at a time.
+	"""
+	processes = []
+	displays = queue.Queue()
+	if display is None:
+		for _ in range(count):
+			process, name = start_virtual_display()
+			if process is None:
+				break
+			processes.append(process)
+			displays.put(dict(os.environ, DISPLAY=name))
+	if not processes:
+		display = display or os.environ.get('DISPLAY')
+		displays.put(dict(os.environ, DISPLAY=display) if display else None)
+	return processes, displays
+
+def stop_displays(processes):
+	for process in processes:
+		process.terminate()
+		process.wait()
+
+def visible_windows(env):
+	"""Ids of the visible windows of the display, whatever their name or class. Needs xdotool."""
+	found = tester_executor.run(['xdotool', 'search', '--onlyvisible', '.*'], env=env, stderr=tester_executor.DEVNULL)
+	return set(found.stdout.split()) if found.returncode == 0 else set()
+
+def run_so_long(file_path, timeout=None, displays=None):
+	"""Runs ./so_long on a map, returns (status, output).
+
+	Without a timeout it waits for so_long to exit. With one, so_long runs on a
+	display of displays and is OK once a new window shows on it, the map was
+	accepted, and it is killed. Still running after timeout seconds without a
+	window, it is killed and gets SO_LONG_TIMEOUT.
+	"""
+	if timeout is None:
+		result = tester_executor.run(['./so_long', file_path], stderr=tester_executor.STDOUT)
+	else:
+		env = displays.get()
+		try:
+			xdotool = shutil.which('xdotool') is not None
+			# The windows already there (another program's on a shared display, or the one of the
+			# previous so_long the X server did not drop yet) are not this so_long's
+			before = visible_windows(env) if xdotool else set()
+			started = {}
+			future = tester_executor.submit(['./so_long', file_path], timeout=timeout, env=env,
+											stderr=tester_executor.STDOUT, on_start=lambda pids: started.update(pid=pids[0]))
+			start = time.time()
+			window = None
+			while window is None and not future.done():
+				time.sleep(WINDOW_POLL_INTERVAL)
+				if xdotool and "pid" in started:
+					window = next(iter(visible_windows(env) - before), None)
+			if window is not None:
+				opened = time.time() - start
+				tester_executor.kill_session(started["pid"])
+			result = future.result()
+		finally:
+			displays.put(env)
+	# Decoded like universal_newlines would, without failing on bytes that are not UTF-8
+	output = result.stdout.decode(errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+	if timeout is not None and window is not None:
+		return SO_LONG_OK, output + f"(window opened after {opened:.1f}s, map accepted)\n"
+	if result.timed_out:
+		return SO_LONG_TIMEOUT, output + f"(still running after {timeout}s without a window, not compared)\n"
+	if result.returncode != 0:
+		return SO_LONG_ERROR, output
+	return SO_LONG_OK, output
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Tests ./so_long against every map under ./maps.")
+	parser.add_argument("--batch", action="store_true",
+						help="run unattended: maps run in parallel on virtual displays (Xvfb), a map whose window shows (found with xdotool) counts as accepted")
+	parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+						help="number of so_long instances running at the same time in batch mode (default: CPU count)")
+	parser.add_argument("--timeout", type=float, default=5.0,
+						help="seconds so_long has in batch mode to fail or show its window, after that it gets a Timeout verdict "
+							 "and is not compared (default: 5)")
+	parser.add_argument("--display",
+						help="X display to use in batch mode instead of starting Xvfb, so_long then runs one map at a time")
+	parser.add_argument("--shrink", action="store_true",
+						help="in batch mode, shrink every discrepancy map and write the smallest one next to it in ./check as <name>.min.ber")
+	parser.add_argument("--no-cache", action="store_true",
+						help="ignore the results cached by earlier runs and test every map again")
+	return parser.parse_args()
+
+def main():
+	args = parse_args()
+	if args.shrink and not args.batch:
+		print(color_text("--shrink runs so_long on hundreds of maps, it needs --batch", RED))
+		exit(1)
+	# so_long runs on the shared engine, Ctrl-C kills the windows still open; in batch mode
+	# every so_long has a second slot for the xdotool looking for its window
+	tester_executor.configure(2 * args.jobs if args.batch else 1)
+	print("This script tests the compiled ./so_long binary.")
+	print("Make sure to compile the ./so_long binary before running this script.")
+	print("It tests against all maps under the directory /maps.\n")
+	if not args.batch:
+		print("When your so_long opened the game, press 'ESC' to close it and continue with the next map.\n")
+	# Wait for user to press Enter
+	# Check if maps directory exists
+	if not os.path.exists('./maps'):
+		print(color_text("No maps folder found", RED))
+		exit()  # terminate the script
+
+	# Check if there are any .ber files in the maps directory
+	if not any(fname.endswith('.ber') for fname in os.listdir('./maps')):
+		print(color_text("No maps in folder", RED))
+		exit()  # terminate the script
+
+	# Check if so_long file exists
+	if not os.path.exists('./so_long'):
+		print(color_text("No so_long found, maybe you forgot to make?", RED))
+		exit()  # terminate the script
+
+	root_dir = './maps'
+	map_files = sorted(os.path.join(dirpath, file) for dirpath, dirnames, filenames in os.walk(root_dir)
+					   for file in filenames if file.endswith('.ber'))
+	# Maps already tested against this exact binary are not run again, their results come from the cache
+	cache = {"validator": {}, "so_long": {}} if args.no_cache else so_long_cache.load_cache()
+	binary_hash = so_long_cache.file_hash('./so_long')
+	map_hashes = {file_path: so_long_cache.file_hash(file_path) for file_path in map_files}
+	to_run = [file_path for file_path in map_files
+			  if so_long_cache.so_long_key(binary_hash, map_hashes[file_path]) not in cache["so_long"]]
+	print(f"{len(map_files) - len(to_run)} map(s) with cached results, {len(to_run)} map(s) to run\n")
+
+	display_processes = []
+	displays = None
+	if args.batch and (to_run or args.shrink):
+		# Valid maps open a window, give them virtual screens nobody has to look at
+		display_processes, displays = start_displays(max(1, args.jobs), args.display)
+		if shutil.which('xdotool') is None:
+			print(color_text("xdotool not found: no window can be confirmed, maps still running after "
+							 "--timeout get a Timeout verdict", YELLOW))
+		if not display_processes and args.display is None:
+			display = os.environ.get('DISPLAY')
+			print(color_text("Xvfb not found, so_long windows open one at a time on " + display if display else
+							 "Xvfb not found and no DISPLAY: valid maps can not open a window and will fail", YELLOW))
+	elif to_run:
+		input("Press Enter to continue...")
+
+		clear_terminal()
+
+	discrepancies = []
+	timeouts = []
+	ok_files = []
+	ok_results = []
+	discrepancy_results = []
+
+	check_dir = './check'
+	os.makedirs(check_dir, exist_ok=True)
+
+	if args.batch:
+		# Batch mode: every so_long gets a timeout and maps run in parallel, results come back in map order
+		executor = ThreadPoolExecutor(max_workers=max(1, args.jobs))
+		so_long_results = executor.map(lambda file_path: run_so_long(file_path, args.timeout, displays), to_run)
+	else:
+		# Run ./so_long, one map at a time, until the player closes the window
+		so_long_results = map(run_so_long, to_run)
+
+	# Asked by path, not by cache key: a map with the same bytes as one before it is in to_run
+	# too and its result has to be taken, even though the earlier one just got cached
+	fresh = set(to_run)
+	try:
+		for file_path in map_files:
+			key = so_long_cache.so_long_key(binary_hash, map_hashes[file_path])
+			if file_path not in fresh:
+				ok, so_long_output = cache["so_long"][key]
+				so_long_status = GREEN + "OK" + RESET if ok else RED + "Error" + RESET
+			else:
+				# to_run is in map order, so the next fresh result is this map's
+				so_long_status, so_long_output = next(so_long_results)
+				# A timeout says nothing about the map, an idle machine may well get a verdict next time
+				if so_long_status != SO_LONG_TIMEOUT:
+					cache["so_long"][key] = [so_long_status == SO_LONG_OK, so_long_output]
+
+			# Validate using our custom function, byte for byte as so_long reads the file, unless this map's verdict is cached
+			validation = cache["validator"].get(map_hashes[file_path])
+			if validation is None:
+				validation = so_long_map_reader.validate_map_file(file_path)
+				cache["validator"][map_hashes[file_path]] = list(validation)
+			is_valid, message = validation
+			if is_valid:
+				validator_status = GREEN + "OK" + RESET
+				# A map so_long timed out on was not compared, it is not counted as OK
+				if so_long_status != SO_LONG_TIMEOUT:
 					ok_files.append(file_path)
 					ok_results.append((file_path, validator_status, validator_status))
-				else:
-					validator_status = RED + "Error" + RESET
-					message = f"Invalid map: {message}"  # Add this line to update the message
-			
-			# Run ./so_long
-			try:
-				so_long_output = subprocess.check_output(['./so_long', file_path], stderr=subprocess.STDOUT, universal_newlines=True)
-				so_long_status = GREEN + "OK" + RESET
-			except subprocess.CalledProcessError as e:
-				so_long_status = RED + "Error" + RESET
-				so_long_output = e.output  # Capture the error output
-			
-			# Compare results
-			if validator_status == so_long_status:
+			else:
+				validator_status = RED + "Error" + RESET
+				message = f"Invalid map: {message}"  # Add this line to update the message
+
+			# Compare results, a so_long that timed out is not known to accept or reject the map
+			if so_long_status == SO_LONG_TIMEOUT:
+				combined_status = YELLOW + "Timeout (not compared)" + RESET
+				timeouts.append(file_path)
+			elif validator_status == so_long_status:
 				combined_status = GREEN + "OK" + RESET
 				if ok_results:
 					ok_results[-1] = (file_path, validator_status, so_long_status)
@@ -185,47 +346,82 @@ for dirpath, dirnames, filenames in os.walk(root_dir):
 				for file_path, validator_status, so_long_status, so_long_output, _ in discrepancies:
 					dest_path = os.path.join(check_dir, os.path.basename(file_path))
 					shutil.copy(file_path, dest_path)
-					
+
 					with open(dest_path, 'a') as copied_file:
 						copied_file.write("\n\nValidator Output:\n")
 						copied_file.write(message)
 						copied_file.write("\n\nso_long Output:\n")
 						copied_file.write(so_long_output)
-				
+
 			print(color_text(f" - Check Filename: {file_path} - Validator: {validator_status}, ./so_long: {so_long_status}", combined_status))
 			print("Validator Output:\n", message)
 			print("so_long Output:\n", so_long_output)
+	finally:
+		# Saved even when the run is interrupted, the maps tested so far are not lost
+		so_long_cache.save_cache(cache, binary_hash, map_hashes.values())
+
+	# Checked copies (and their shrunk versions) of maps that no longer disagree are stale,
+	# files the fuzzer left in ./check are not ours to remove
+	current = {os.path.basename(file_path) for file_path, *_ in discrepancies}
+	stale = {os.path.basename(file_path) for file_path in map_files} - current
+	stale |= {filename[:-len('.ber')] + '.min.ber' for filename in stale}
+	for filename in os.listdir(check_dir):
+		if filename in stale:
+			file_path = os.path.join(check_dir, filename)
+			try:
+				os.remove(file_path)
+				print(f"Removed: {file_path}")
+			except OSError as e:
+				print(f"Error removing {file_path}: {e}")
+
+	if args.shrink and discrepancies:
+		# Imported here, the shrinker imports this module
+		import so_long_map_shrinker
+		print("\nShrinking the discrepancy maps:")
+		so_long_map_shrinker.shrink_files(sorted(os.path.join(check_dir, filename) for filename in current),
+										  args.jobs, args.timeout, displays)
+
+	if args.batch:
+		executor.shutdown()
+		stop_displays(display_processes)
+	else:
+		clear_terminal()
+	# Display OK Maps
+	print("-"*100)
+	print("\n")
+	print("\nSUMMARY:")
+
+	# Count OK files and discrepancies
+	num_ok_files = len(ok_files)
+	num_discrepancies = len(discrepancy_results)
+	total_runs = num_ok_files + num_discrepancies
+
+	print(f"Total runs: {total_runs}")
+	print(f"Total OK: {num_ok_files}")
+	print(f"Total discrepancies: {num_discrepancies}")
+	print(f"Total timeouts (not compared): {len(timeouts)}\n")
+
+	# Display Discrepancies Maps
+	if discrepancy_results:
+		print("-" * 100)
+		print("\nDiscrepancies Maps:")
+		for file_path, validator_status, so_long_status in discrepancy_results:
+			print(f"Map: {file_path}   validator result: {validator_status}   so_long result: {so_long_status}")
+
+	# Display discrepancies summary
+	if not discrepancies and not timeouts:
+		print("-" * 100)
+		print("\nNo discrepancies found. Both validation mechanisms are consistent.")
+	elif not discrepancies:
+		print("-" * 100)
+		print(f"\nNo discrepancies found, but {len(timeouts)} map(s) timed out and were not compared.")
+	else:
+		print("-" * 100)
+		print("\nDiscrepancies Summary:")
+		for file_path, validator_status, so_long_status, so_long_output, combined_status in discrepancies:
+			print(color_text(f"Check Filename: {file_path} - Validator: {validator_status}, ./so_long: {so_long_status}", combined_status))
+			print("Validator Output:\n", message)
+			print("so_long Output:\n", so_long_output)
 
-# Display OK Maps
-clear_terminal()
-print("-"*100)
-print("\n")
-print("\nSUMMARY:")
-
-# Count OK files and discrepancies
-num_ok_files = len(ok_files)
-num_discrepancies = len(discrepancy_results)
-total_runs = num_ok_files + num_discrepancies
-
-print(f"Total runs: {total_runs}")
-print(f"Total OK: {num_ok_files}")
-print(f"Total discrepancies: {num_discrepancies}\n")
-
-# Display Discrepancies Maps
-if discrepancy_results:
-    print("-" * 100)
-    print("\nDiscrepancies Maps:")
-    for file_path, validator_status, so_long_status in discrepancy_results:
-        print(f"Map: {file_path}   validator result: {validator_status}   so_long result: {so_long_status}")
-
-# Display discrepancies summary
-if not discrepancies:
-    print("-" * 100)
-    print("\nNo discrepancies found. Both validation mechanisms are consistent.")
-else:
-    print("-" * 100)
-    print("\nDiscrepancies Summary:")
-    for file_path, validator_status, so_long_status, so_long_output, combined_status in discrepancies:
-        print(color_text(f"Check Filename: {file_path} - Validator: {validator_status}, ./so_long: {so_long_status}", combined_status))
-        print("Validator Output:\n", message)
-        print("so_long Output:\n", so_long_output)
\ No newline at end of file
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,245 @@
+import argparse
+import random
+import time
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+try:
+	from scipy import ndimage
+except ImportError:
+	ndimage = None
+
+# Array based versions of so_long_map_tester.is_valid_map and
+# so_long_map_generator.validate_map, for the big stress maps (1000x1000 and up).
+# The map is loaded into a uint8 array once, walls, charset and P/E/C counts are
+# checked with array operations and reachability is a single labelling pass
+# (scipy.ndimage.label) or, without scipy, a union-find over row runs in NumPy.
+# Both functions return exactly the verdicts and messages of the originals,
+# which they fall back to when NumPy is missing or the map is degenerate.
+
+VALID_CELLS = b'E10CP'
+WALL = ord('1')
+
+
+def reference_is_valid_map(map_content):
+	# Imported here, so_long_map_tester imports this module
+	from so_long_map_tester import is_valid_map
+	return is_valid_map(map_content)
+
+
+def reference_validate_map(map_data):
+	from so_long_map_generator import validate_map
+	return validate_map(map_data)
+
+
+def load_map(lines):
+	"""Returns a rectangular map as a (rows, columns) uint8 array.
+
+	Characters outside latin-1 become '?', they are invalid cells either way and
+	every character still takes exactly one byte, so positions are unchanged.
+	"""
+	data = "".join(lines).encode('latin-1', errors='replace')
+	return np.frombuffer(data, dtype=np.uint8).reshape(len(lines), len(lines[0]))
+
+
+def surrounded_by_walls(grid):
+	return bool((grid[0] == WALL).all() and (grid[-1] == WALL).all()
+				and (grid[:, 0] == WALL).all() and (grid[:, -1] == WALL).all())
+
+
+def run_ids(passable):
+	"""Numbers the runs of passable cells of a flattened grid, 0 for blocked cells."""
+	starts = passable.copy()
+	starts[1:] &= ~passable[:-1]
+	return np.cumsum(starts) * passable
+
+
+def reachable(passable, start):
+	"""Returns the boolean mask of the passable cells 4-connected to start.
+
+	The grid must be surrounded by blocked cells, so that a run of a flattened
+	row never wraps onto the next one.
+	"""
+	if ndimage is not None:
+		labels, _ = ndimage.label(passable)
+		return labels == labels[start]
+	# Without scipy: union-find over the row runs of passable cells. Runs joined by
+	# a vertical step are merged by hooking the larger root onto the smaller one,
+	# then compressing paths, until no pair of joined runs has different roots.
+	width = passable.shape[1]
+	cells = passable.ravel()
+	runs = run_ids(cells)
+	below = np.flatnonzero(cells[:-width] & cells[width:])
+	upper, lower = runs[below], runs[below + width]
+	roots = np.arange(int(runs.max()) + 1)
+	while True:
+		upper_roots, lower_roots = roots[upper], roots[lower]
+		joined = upper_roots != lower_roots
+		if not joined.any():
+			break
+		upper_roots, lower_roots = upper_roots[joined], lower_roots[joined]
+		np.minimum.at(roots, np.maximum(upper_roots, lower_roots), np.minimum(upper_roots, lower_roots))
+		while True:
+			compressed = roots[roots]
+			if np.array_equal(compressed, roots):
+				break
+			roots = compressed
+	component = roots[runs]
+	return (component == component[start[0] * width + start[1]]).reshape(passable.shape) & passable
+
+
+def position(grid, flat_index):
+	i, j = divmod(int(flat_index), grid.shape[1])
+	return i, j
+
+
+def is_valid_map(map_content):
+	"""Same verdict and message as so_long_map_tester.is_valid_map."""
+	row_lengths = set(len(line) for line in map_content)
+	if np is None or len(row_lengths) != 1 or 0 in row_lengths:
+		return reference_is_valid_map(map_content)
+	grid = load_map(map_content)
+
+	if not surrounded_by_walls(grid):
+		return False, "Map is not surrounded by walls"
+	# Every line starts with a wall here, so the original empty line checks can never fail
+
+	# The original scans row by row and stops at the first invalid cell, second P
+	# or second E, whichever comes first
+	flat = grid.ravel()
+	invalid = np.flatnonzero(~np.isin(flat, np.frombuffer(VALID_CELLS, dtype=np.uint8)))
+	players = np.flatnonzero(flat == ord('P'))
+	exits = np.flatnonzero(flat == ord('E'))
+	collectibles = np.flatnonzero(flat == ord('C'))
+	first_errors = []
+	if invalid.size:
+		first_errors.append((invalid[0], "invalid"))
+	if players.size > 1:
+		first_errors.append((players[1], "player"))
+	if exits.size > 1:
+		first_errors.append((exits[1], "exit"))
+	if first_errors:
+		index, error = min(first_errors)
+		if error == "invalid":
+			i, j = position(grid, index)
+			return False, f"Invalid cell '{map_content[i][j]}' found at position ({i}, {j})"
+		if error == "player":
+			return False, "More than one player ('P')"
+		return False, "More than one exit ('E')"
+
+	if not players.size:
+		return False, "Map missing player's starting position"
+	if not exits.size:
+		return False, "Map missing exit"
+	if not collectibles.size:
+		return False, "Map missing collectibles"
+
+	# Only valid cells are left, everything but walls can be walked on
+	visited = reachable(grid != WALL, position(grid, players[0])).ravel()
+	if not visited[exits[0]]:
+		return False, "No path from start to exit"
+	unreached = collectibles[~visited[collectibles]]
+	if unreached.size:
+		return False, f"No path from start to collectible at {position(grid, unreached[0])}"
+	return True, "Valid map"
+
+
+def validate_map(map_data):
+	"""Same verdict and message as so_long_map_generator.validate_map."""
+	row_lengths = set(len(row) for row in map_data)
+	if np is None or len(row_lengths) != 1 or 0 in row_lengths:
+		return reference_validate_map(map_data)
+	grid = load_map(map_data)
+
+	if not surrounded_by_walls(grid):
+		return False, "Map is not surrounded by walls."
+	flat = grid.ravel()
+	players = np.flatnonzero(flat == ord('P'))
+	if players.size != 1 or np.count_nonzero(flat == ord('E')) != 1 or not np.count_nonzero(flat == ord('C')):
+		return False, "Map missing required elements."
+
+	# validate_map walks on anything that is not a wall, invalid characters included
+	visited = reachable(grid != WALL, position(grid, players[0])).ravel()
+	targets = np.flatnonzero((flat == ord('C')) | (flat == ord('E')))
+	unreached = targets[~visited[targets]]
+	if unreached.size:
+		i, j = position(grid, unreached[0])
+		return False, f"No path to {map_data[i][j]} at ({i}, {j})"
+	return True, "Map is valid."
+
+
+def generate_stress_map(width, height, rng, wall_ratio=0.3):
+	"""Generates a valid width x height map, random cells like so_long_map_generator.
+
+	Valid maps are the slow case, every check runs and the flood fill covers the
+	whole map, so pockets the player cannot reach are walled in.
+	"""
+	cells = [['1'] * width for _ in range(height)]
+	for i in range(1, height - 1):
+		cells[i][1:width - 1] = rng.choices('01C', weights=(1 - wall_ratio - 0.01, wall_ratio, 0.01), k=width - 2)
+	# An open first row joins the player and the exit
+	cells[1][1:width - 1] = ['0'] * (width - 2)
+	cells[1][1], cells[1][width - 2], cells[1][width // 2] = 'P', 'E', 'C'
+	grid = load_map([''.join(row) for row in cells]).copy()
+	grid[~reachable(grid != WALL, (1, 1))] = WALL
+	return [row.tobytes().decode('latin-1') for row in grid]
+
+
+def timed(function, map_data, repeat):
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = function(map_data)
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return result, best
+
+
+def run_benchmark(sizes, repeat, seed):
+	"""Times the original validators against the array ones on random maps of every size."""
+	print(f"NumPy {np.__version__}, flood fill: {'scipy.ndimage.label' if ndimage is not None else 'union-find over row runs'}")
+	print(f"{'size':>11}  {'function':<13} {'original':>10} {'numpy':>10} {'speedup':>8}  verdict")
+	mismatches = 0
+	for size in sizes:
+		map_data = generate_stress_map(size, size, random.Random(f"{seed}:{size}"))
+		for name, original, vectorised in (("is_valid_map", reference_is_valid_map, is_valid_map),
+										   ("validate_map", reference_validate_map, validate_map)):
+			expected, original_time = timed(original, map_data, repeat)
+			result, vectorised_time = timed(vectorised, map_data, repeat)
+			if result != expected:
+				mismatches += 1
+			verdict = result[1] if result == expected else f"MISMATCH {result} != {expected}"
+			print(f"{size:>5}x{size:<5}  {name:<13} {original_time:>9.3f}s {vectorised_time:>9.3f}s "
+				  f"{original_time / vectorised_time:>7.1f}x  {verdict}")
+	return mismatches
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Validates so_long maps with NumPy, or benchmarks it against the original validators.")
+	parser.add_argument("maps", nargs="*", help=".ber files to validate")
+	parser.add_argument("--benchmark", action="store_true", help="time the original and the NumPy validators")
+	parser.add_argument("--sizes", default="100,500,1000,2000", help="comma separated map sizes for --benchmark (default: 100,500,1000,2000)")
+	parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best one is kept (default: 3)")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the benchmark maps (default: 0)")
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	if args.benchmark:
+		if np is None:
+			print("The benchmark needs NumPy (pip install numpy)")
+			exit(1)
+		exit(1 if run_benchmark([int(size) for size in args.sizes.split(',')], args.repeat, args.seed) else 0)
+	for path in args.maps:
+		with open(path, 'r') as f:
+			content = [line.strip() for line in f.readlines()]
+		_, message = is_valid_map(content)
+		print(f"{path}: {message}")
+
+
+if __name__ == "__main__":
+	main()
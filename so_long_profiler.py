@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import so_long_map_generator
+import tester_executor
+from so_long_map_tester import GREEN, RED, YELLOW, color_text, start_virtual_display, visible_windows
+
+# Profiles ./so_long on generated maps of growing sizes. Each map is
+# generate_random_map's output for a seed derived from --seed and the size, made
+# playable (P, E and a C joined, unreachable cells walled in), so the same
+# command profiles the same maps. Maps run one at a time on a virtual display:
+# - first frame: seconds from the spawn of so_long until its window is mapped,
+#   found by polling xdotool for a visible window that was not on the display
+#   before so_long started
+# - runtime: seconds from the spawn until so_long exits, after ESC was sent to
+#   its window --hold seconds after the first frame
+# - peak RSS: so_long's maximum resident set size, as tester_executor measures it
+# Without xdotool only the peak RSS is measured, so_long is killed after --hold.
+# The medians of every size are fitted against the number of tiles N: a linear
+# fit gives the fixed cost and the cost per tile, and the best of the curves
+# cost = a + b N^k, k from 0.5 to 3, gives the growth exponent k. The startup
+# cost hides the growth of small maps, so k is only fitted once the biggest map
+# costs GROWTH_FLOOR times the smallest one.
+
+WORK_DIR = './.profile_maps'
+DEFAULT_SIZES = [(8, 5), (16, 9), (32, 17), (64, 33), (128, 65)]
+# Seconds between two window lookups
+POLL_INTERVAL = 0.01
+# Costs above this exponent grow faster than the map
+SUPERLINEAR_EXPONENT = 1.2
+# The growth exponent is fitted once the biggest map costs this times the smallest one
+GROWTH_FLOOR = 1.5
+# Exponents tried by the curve fit
+EXPONENTS = [step / 20 for step in range(10, 61)]
+# ru_maxrss is in KiB on Linux, in bytes on macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+METRICS = [("first_frame", "first frame"), ("runtime", "runtime"), ("peak_rss", "peak RSS")]
+
+
+def profile_map(width, height, seed):
+	"""generate_random_map's map of this size for this seed, made playable, as a list of rows."""
+	rng = random.Random(f"{seed}:{width}x{height}")
+	map_data = [list(row) for row in so_long_map_generator.generate_random_map(width, height, rng)]
+	start, exit = (so_long_map_generator.cells_of(map_data, kind)[0] for kind in 'PE')
+	collectible = so_long_map_generator.cells_of(map_data, 'C')[0]
+	so_long_map_generator.carve_path(map_data, start, exit)
+	so_long_map_generator.carve_path(map_data, start, collectible)
+	so_long_map_generator.wall_off_unreachable(map_data, start)
+	return [''.join(row) for row in map_data]
+
+
+def write_maps(sizes, seed):
+	"""Writes the map of every size into WORK_DIR, returns their paths."""
+	os.makedirs(WORK_DIR, exist_ok=True)
+	paths = []
+	for width, height in sizes:
+		path = os.path.join(WORK_DIR, f"{width}x{height}.ber")
+		with open(path, 'w') as f:
+			f.write('\n'.join(profile_map(width, height, seed)) + '\n')
+		paths.append(path)
+	return paths
+
+
+def profile_run(path, timeout, hold, env, xdotool):
+	"""Runs so_long once on a map, returns {"first_frame", "runtime", "peak_rss" (bytes), "status", "output"}.
+
+	Times are None when they could not be measured.
+	"""
+	started = {}
+	ready = threading.Event()
+
+	def on_start(pids):
+		started["pid"], started["time"] = pids[0], time.perf_counter()
+		ready.set()
+
+	# The windows already on the display are not so_long's
+	before = visible_windows(env) if xdotool else set()
+	with ThreadPoolExecutor(max_workers=1) as executor:
+		future = executor.submit(tester_executor.run, ['./so_long', path], timeout=timeout if xdotool else hold,
+								 env=env, stderr=tester_executor.STDOUT, on_start=on_start)
+		while not ready.wait(POLL_INTERVAL) and not future.done():
+			pass
+
+		first_frame = None
+		if xdotool and ready.is_set():
+			window = None
+			while window is None and not future.done():
+				window = next(iter(visible_windows(env) - before), None)
+				if window is None:
+					time.sleep(POLL_INTERVAL)
+			if window is not None:
+				first_frame = time.perf_counter() - started["time"]
+				wait([future], timeout=hold)
+				tester_executor.run(['xdotool', 'key', '--window', window.decode(), 'Escape'], env=env,
+									stdout=tester_executor.DEVNULL, stderr=tester_executor.DEVNULL)
+		result = future.result()
+	process = result.processes[0]
+	output = result.stdout.decode(errors='replace').strip()
+	if result.timed_out:
+		# Killed by us: the window stayed open, the RSS is still meaningful
+		status = "no exit on ESC" if first_frame is not None else ("no window" if xdotool else "OK")
+	else:
+		status = result.status
+	return {"first_frame": first_frame,
+			"runtime": process.elapsed if first_frame is not None and not result.timed_out else None,
+			"peak_rss": process.peak_rss * RSS_UNIT if process.peak_rss is not None else None, "status": status, "output": output}
+
+
+def summarize(width, height, runs):
+	"""Medians of the runs of one size, a metric is None when no run measured it."""
+	summary = {"size": f"{width}x{height}", "tiles": width * height, "runs": runs,
+			   "status": next((run["status"] for run in runs if run["status"] != "OK"), "OK")}
+	for metric, _ in METRICS:
+		values = [run[metric] for run in runs if run[metric] is not None]
+		summary[metric] = statistics.median(values) if values else None
+	return summary
+
+
+def linear_fit(xs, ys):
+	"""Least squares y = a + b x, returns (a, b)."""
+	mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+	spread = sum((x - mean_x) ** 2 for x in xs)
+	slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread if spread else 0.0
+	return mean_y - slope * mean_x, slope
+
+
+def growth_exponent(tiles, values):
+	"""k of the curve a + b tiles^k closest to values (least squares), None while the startup cost dominates."""
+	if values[-1] < GROWTH_FLOOR * values[0]:
+		return None
+
+	def error(k):
+		scaled = [n ** k for n in tiles]
+		fixed, slope = linear_fit(scaled, values)
+		return sum((fixed + slope * x - y) ** 2 for x, y in zip(scaled, values))
+	return min(EXPONENTS, key=error)
+
+
+def fit(summaries, metric, max_bytes_per_tile):
+	"""Returns {"fixed", "per_tile", "exponent", "flags"} for one metric, or None with fewer than 3 sizes measured."""
+	points = sorted((summary["tiles"], summary[metric]) for summary in summaries if summary[metric] is not None)
+	if len(points) < 3:
+		return None
+	tiles, values = (list(column) for column in zip(*points))
+	fixed, per_tile = linear_fit(tiles, values)
+	exponent = growth_exponent(tiles, values)
+	flags = []
+	if exponent is not None and exponent > SUPERLINEAR_EXPONENT:
+		flags.append(f"superlinear growth (~N^{exponent:.2f})")
+	if metric == "peak_rss" and per_tile > max_bytes_per_tile:
+		flags.append(f"{per_tile:.0f} bytes per tile (limit {max_bytes_per_tile})")
+	return {"fixed": fixed, "per_tile": per_tile, "exponent": exponent, "flags": flags}
+
+
+def format_value(metric, value):
+	if value is None:
+		return "-"
+	if metric == "peak_rss":
+		return f"{value / 2 ** 20:.1f} MiB"
+	return f"{value * 1000:.1f} ms"
+
+
+def format_fit(metric, result):
+	if metric == "peak_rss":
+		cost = f"{result['fixed'] / 2 ** 20:.1f} MiB + {result['per_tile']:.0f} B/tile"
+	else:
+		cost = f"{result['fixed'] * 1000:.1f} ms + {result['per_tile'] * 1e6:.2f} µs/tile"
+	growth = f"~N^{result['exponent']:.2f}" if result['exponent'] is not None else "flat (startup dominated)"
+	return f"{cost}, growth {growth}"
+
+
+def print_profile(summaries, fits):
+	print(f"{'size':>9} {'tiles':>7} {'first frame':>12} {'runtime':>11} {'peak RSS':>11}  status")
+	for summary in summaries:
+		status = summary["status"]
+		print(f"{summary['size']:>9} {summary['tiles']:>7} {format_value('first_frame', summary['first_frame']):>12} "
+			  f"{format_value('runtime', summary['runtime']):>11} {format_value('peak_rss', summary['peak_rss']):>11}  "
+			  f"{color_text(status, GREEN if status == 'OK' else RED)}")
+	print()
+	for metric, name in METRICS:
+		result = fits[metric]
+		if result is None:
+			print(f"{name + ':':<13} not enough sizes measured to fit")
+			continue
+		print(f"{name + ':':<13} {format_fit(metric, result)}")
+		for flag in result["flags"]:
+			print(color_text(f"{'':<13} {flag}", YELLOW))
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Profiles ./so_long's startup latency, runtime and peak RSS on generated maps of growing sizes.")
+	parser.add_argument("--sizes", type=lambda value: [so_long_map_generator.parse_size(size) for size in value.split(',')],
+						default=DEFAULT_SIZES, metavar="WxH[,WxH...]",
+						help="map sizes, smallest first (default: " + ",".join(f"{w}x{h}" for w, h in DEFAULT_SIZES) + ")")
+	parser.add_argument("--repeat", type=int, default=3, help="runs per size, their medians are kept (default: 3)")
+	parser.add_argument("--seed", type=int, default=0, help="seed the maps derive from (default: 0)")
+	parser.add_argument("--hold", type=float, default=1.0,
+						help="seconds the window stays open before ESC, or before so_long is killed without xdotool (default: 1)")
+	parser.add_argument("--timeout", type=float, default=10.0,
+						help="seconds before a so_long that opened no window or ignored ESC is killed (default: 10)")
+	parser.add_argument("--max-bytes-per-tile", type=float, default=1024,
+						help="flag a peak RSS growing by more than this per tile (default: 1024)")
+	parser.add_argument("--display", help="X display to use instead of starting Xvfb")
+	parser.add_argument("--json", metavar="PATH", help="also write the measurements and fits to PATH")
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	# One so_long at a time, the other slot runs xdotool while it is open
+	tester_executor.configure(2)
+	if not os.path.exists('./so_long'):
+		print(color_text("No so_long found, maybe you forgot to make?", RED))
+		exit(1)
+	xdotool = shutil.which('xdotool') is not None
+	if not xdotool:
+		print(color_text(f"xdotool not found: only the peak RSS is measured, so_long is killed after {args.hold}s", YELLOW))
+
+	display_process, display = (None, args.display) if args.display else start_virtual_display()
+	if display is None:
+		display = os.environ.get('DISPLAY')
+		print(color_text("Xvfb not found, so_long windows open on " + display if display else
+						 "Xvfb not found and no DISPLAY: so_long can not open a window", YELLOW))
+	env = dict(os.environ, DISPLAY=display) if display else None
+	sizes = sorted(args.sizes, key=lambda size: size[0] * size[1])
+	summaries = []
+	try:
+		for (width, height), path in zip(sizes, write_maps(sizes, args.seed)):
+			runs = [profile_run(path, args.timeout, args.hold, env, xdotool) for _ in range(args.repeat)]
+			summaries.append(summarize(width, height, runs))
+			failed = next((run for run in runs if run["status"] not in ("OK", "no exit on ESC")), None)
+			if failed is not None and failed["output"]:
+				print(color_text(f"{width}x{height}: {failed['output'].splitlines()[0]}", RED))
+	finally:
+		if display_process is not None:
+			display_process.terminate()
+			display_process.wait()
+		shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+	fits = {metric: fit(summaries, metric, args.max_bytes_per_tile) for metric, _ in METRICS}
+	print_profile(summaries, fits)
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump({"seed": args.seed, "hold": args.hold, "sizes": summaries, "fits": fits}, f, indent=2)
+		print(f"\nMeasurements written to {args.json}")
+	if any(result is not None and result["flags"] for result in fits.values()):
+		exit(1)
+
+
+if __name__ == "__main__":
+	main()
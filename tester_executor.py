@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import os
+import resource
+import signal
+import subprocess
+import threading
+import time
+from collections import Counter, namedtuple
+
+# Runs the processes of every tester: push_swap pipelines, valgrind and make in
+# binary_tester, so_long maps. One asyncio loop, in a background thread, drives
+# all of them, so the testers keep their synchronous code and worker threads:
+# run() hands a pipeline to the loop and blocks until it is done.
+# A pipeline is one or more commands chained by pipes, like a shell pipeline.
+# Every command runs in a session of its own, so a timeout or Ctrl-C kills it
+# with everything it started (valgrind's tools, so_long's children...). At most
+# `jobs` pipelines run at the same time, whatever the number of threads asking.
+# The exit status of every command is collected with wait4, and its peak RSS is
+# sampled from /proc while it runs, see peak_rss().
+
+# stdout/stderr of run(), as in subprocess: PIPE collects the output into the
+# result, None inherits the tester's, DEVNULL drops it, STDOUT (stderr only)
+# merges it into stdout. A callable gets every chunk as soon as it is read.
+PIPE = subprocess.PIPE
+DEVNULL = subprocess.DEVNULL
+STDOUT = subprocess.STDOUT
+CHUNK_SIZE = 64 * 1024
+# Seconds between two peak RSS samples, doubled after every sample up to the maximum
+RSS_SAMPLE_FIRST = 0.001
+RSS_SAMPLE_MAX = 0.02
+
+# Times are in seconds, peak RSS in KiB (bytes on macOS, see getrusage(2)), the
+# command's own, None when it could not be measured (see peak_rss())
+ProcessResult = namedtuple('ProcessResult', ['command', 'returncode', 'status', 'elapsed', 'peak_rss'])
+# returncode and status are the last command's, like a shell; stdout/stderr are None unless collected
+RunResult = namedtuple('RunResult', ['stdout', 'stderr', 'returncode', 'status', 'timed_out', 'processes'])
+
+
+class Interrupted(Exception):
+    """Raised by the runs started or running after Ctrl-C."""
+
+
+settings = {"jobs": os.cpu_count() or 1}
+engine = {"loop": None, "semaphore": None}
+engine_lock = threading.RLock()
+# Sessions of the commands running right now, killed on Ctrl-C
+live_sessions = set()
+interrupted = threading.Event()
+
+
+def classify(returncode, timed_out=False):
+    """Returns "OK", "exit N", the name of the killing signal (e.g. "SIGSEGV") or "TIMEOUT"."""
+    if timed_out:
+        return "TIMEOUT"
+    if returncode == 0:
+        return "OK"
+    if returncode > 0:
+        return f"exit {returncode}"
+    try:
+        return signal.Signals(-returncode).name
+    except ValueError:
+        return f"signal {-returncode}"
+
+
+def configure(jobs=None):
+    """Sets the number of pipelines running at the same time and installs the Ctrl-C handler.
+
+    Call it from the main thread, before the first run.
+    """
+    if jobs is not None:
+        settings["jobs"] = max(1, jobs)
+        engine["semaphore"] = None
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, handle_interrupt)
+
+
+def interrupt():
+    """Kills every running command and makes every later run raise Interrupted."""
+    with engine_lock:
+        interrupted.set()
+        for session in live_sessions:
+            kill_session(session)
+
+
+def handle_interrupt(signum, frame):
+    # The commands run in sessions of their own, the terminal's SIGINT does not reach them
+    interrupt()
+    signal.default_int_handler(signum, frame)
+
+
+def kill_session(session):
+    try:
+        os.killpg(session, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def event_loop():
+    """Returns the engine's event loop, started in a daemon thread on first use."""
+    with engine_lock:
+        if engine["loop"] is None:
+            engine["loop"] = asyncio.new_event_loop()
+            threading.Thread(target=engine["loop"].run_forever, name="tester_executor", daemon=True).start()
+        return engine["loop"]
+
+
+def semaphore():
+    # Created in the loop, and again after configure() changed the number of jobs
+    if engine["semaphore"] is None:
+        engine["semaphore"] = asyncio.Semaphore(settings["jobs"])
+    return engine["semaphore"]
+
+
+def spawn(commands, cwd, env, preexec_fn, stdout, stderr):
+    """Starts the commands chained by pipes, returns their Popen objects."""
+    processes = []
+    stdin = DEVNULL
+    try:
+        for index, command in enumerate(commands):
+            last = index == len(commands) - 1
+            with engine_lock:
+                if interrupted.is_set():
+                    raise Interrupted()
+                process = subprocess.Popen(
+                    command, stdin=stdin,
+                    stdout=(PIPE if callable(stdout) else stdout) if last else PIPE,
+                    stderr=(PIPE if callable(stderr) else stderr) if last else None,
+                    cwd=cwd, env=env, preexec_fn=preexec_fn, start_new_session=True)
+                live_sessions.add(process.pid)
+            process.start = time.perf_counter()
+            # Popen returns once the command was exec'd, the tester's peak RSS is what wait4 may inherit
+            process.rss_floor = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            process.rss_samples = []
+            processes.append(process)
+            if stdin is not DEVNULL:
+                # The next command holds the read end now
+                stdin.close()
+            stdin = process.stdout
+    except BaseException:
+        for process in processes:
+            kill_session(process.pid)
+            reap_now(process)
+        raise
+    return processes
+
+
+def sample_rss(process):
+    """Records the command's high-water RSS (VmHWM) while it runs, on systems with /proc."""
+    try:
+        with open(f'/proc/{process.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    process.rss_samples.append(int(line.split()[1]))
+                    return
+    except OSError:
+        pass
+
+
+def peak_rss(process):
+    """The command's own peak RSS, None when it is unknown.
+
+    wait4's ru_maxrss is not enough on its own: the kernel carries the RSS of
+    the forking process over fork and exec, so it is never below the tester's
+    RSS at the spawn. Above the tester's peak it is the command's, below it the
+    last VmHWM sample stands in, it misses at most the growth of the command
+    after that sample.
+    """
+    if process.usage.ru_maxrss > process.rss_floor:
+        return process.usage.ru_maxrss
+    return max(process.rss_samples, default=None)
+
+
+def reap_now(process):
+    """Blocking wait4 on a process that was killed or already exited."""
+    if process.returncode is None:
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        process.usage = usage
+        process.elapsed = time.perf_counter() - process.start
+    with engine_lock:
+        live_sessions.discard(process.pid)
+    for pipe in (process.stdout, process.stderr):
+        if pipe is not None and not pipe.closed:
+            pipe.close()
+
+
+async def sample_until(process, exited):
+    """Samples the command's peak RSS until exited is done, more and more rarely."""
+    interval = RSS_SAMPLE_FIRST
+    while not exited.done():
+        sample_rss(process)
+        await asyncio.wait([exited], timeout=interval)
+        interval = min(interval * 2, RSS_SAMPLE_MAX)
+    await exited
+
+
+async def wait_exit(process):
+    """Waits for a process without blocking the loop, then reaps it with wait4 for its rusage."""
+    loop = asyncio.get_running_loop()
+    try:
+        pidfd = os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        # No pidfd (macOS, old kernels): wait4 blocks in a thread of the loop's default pool instead
+        pidfd = None
+    if pidfd is None:
+        exited = loop.run_in_executor(None, os.wait4, process.pid, 0)
+        await sample_until(process, exited)
+        _, status, usage = await exited
+    else:
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await sample_until(process, exited)
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+        _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    process.usage = usage
+    process.elapsed = time.perf_counter() - process.start
+    with engine_lock:
+        live_sessions.discard(process.pid)
+
+
+async def pump(pipe, sink):
+    """Hands every chunk read from pipe to sink until EOF."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=CHUNK_SIZE)
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    try:
+        while True:
+            chunk = await reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sink(chunk)
+    finally:
+        transport.close()
+
+
+async def run_async(commands, timeout=None, cwd=None, env=None, preexec_fn=None, stdout=PIPE, stderr=PIPE,
+                    on_start=None):
+    """Runs a command (a list of arguments) or a pipeline (a list of commands), returns a RunResult.
+
+    stdout and stderr apply to the last command, the others keep the tester's
+    stderr, like `a | b 2>&1` in a shell. After timeout seconds every command of
+    the pipeline is killed, the output read so far is kept. on_start is called
+    in the loop with the pids once every command started.
+    """
+    if commands and isinstance(commands[0], str):
+        commands = [commands]
+    async with semaphore():
+        processes = spawn(commands, cwd, env, preexec_fn, stdout, stderr)
+        if on_start is not None:
+            on_start([process.pid for process in processes])
+        collected = {}
+        tasks = []
+        last = processes[-1]
+        for name, pipe, sink in (("stdout", last.stdout, stdout), ("stderr", last.stderr, stderr)):
+            if pipe is None:
+                continue
+            if not callable(sink):
+                sink = collected.setdefault(name, bytearray()).extend
+            tasks.append(asyncio.ensure_future(pump(pipe, sink)))
+        tasks += [asyncio.ensure_future(wait_exit(process)) for process in processes]
+        work = asyncio.gather(*tasks)
+        timed_out = False
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(work), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                for process in processes:
+                    kill_session(process.pid)
+                await work
+        except BaseException:
+            # Cancelled, or a sink failed: nothing may outlive the run
+            for process in processes:
+                kill_session(process.pid)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for process in processes:
+                reap_now(process)
+            raise
+    if interrupted.is_set():
+        raise Interrupted()
+    results = [ProcessResult(process.args, process.returncode, classify(process.returncode),
+                             process.elapsed, peak_rss(process)) for process in processes]
+    output = {name: bytes(data) for name, data in collected.items()}
+    return RunResult(output.get("stdout"), output.get("stderr"), last.returncode,
+                     classify(last.returncode, timed_out), timed_out, results)
+
+
+def submit(commands, **options):
+    """Starts a command or a pipeline on the engine from any thread, returns a concurrent.futures.Future of its RunResult."""
+    return asyncio.run_coroutine_threadsafe(run_async(commands, **options), event_loop())
+
+
+def run(commands, **options):
+    """Runs a command or a pipeline on the engine from any thread, blocks until it is done.
+
+    Takes the arguments of run_async and returns its RunResult.
+    """
+    future = submit(commands, **options)
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        future.cancel()
+        raise
+
+
+def run_all(commands, **options):
+    """Runs every command (or pipeline) concurrently, up to the jobs limit, returns the RunResults in order."""
+    async def run_every():
+        return await asyncio.gather(*(run_async(command, **options) for command in commands))
+    future = asyncio.run_coroutine_threadsafe(run_every(), event_loop())
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        future.cancel()
+        raise
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks the engine: runs a command many times and reports the throughput.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of commands running at the same time (default: CPU count)")
+    parser.add_argument("--count", type=int, default=1000, help="number of runs (default: 1000)")
+    parser.add_argument("--timeout", type=float, help="seconds before a run is killed")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="command to run, '|' separated for a pipeline (default: true)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure(args.jobs)
+    words = args.command or ["true"]
+    pipeline = [[]]
+    for word in words:
+        if word == "|":
+            pipeline.append([])
+        else:
+            pipeline[-1].append(word)
+    start = time.perf_counter()
+    results = run_all([pipeline] * args.count, timeout=args.timeout, stdout=DEVNULL, stderr=DEVNULL)
+    elapsed = time.perf_counter() - start
+    statuses = Counter(result.status for result in results)
+    print(f"{args.count} runs of {' | '.join(' '.join(command) for command in pipeline)} with {args.jobs} jobs: "
+          f"{elapsed:.2f}s, {args.count / elapsed:.0f} runs/s")
+    print(", ".join(f"{status}: {count}" for status, count in statuses.most_common()))
+
+
+if __name__ == "__main__":
+    main()